@@ -0,0 +1,61 @@
+# audio_decode.py
+"""
+In-memory audio decoding: encoded bytes in, PCM out, through an ffmpeg pipe.
+Nothing touches the disk except for containers ffmpeg cannot read from a pipe.
+"""
+import os
+import subprocess
+import tempfile
+
+import numpy as np
+from pydub import AudioSegment
+
+SAMPLE_RATE = 16000
+
+# mp4-family files usually keep their index (moov atom) at the end, so ffmpeg
+# needs a seekable input; these get a temp file only if the pipe decode fails.
+_NEEDS_SEEK = {".mp4", ".m4a", ".mov", ".3gp"}
+
+
+def _ffmpeg_cmd(src: str, sr: int, fmt: str):
+    return [
+        "ffmpeg", "-v", "error",
+        "-fflags", "+genpts+discardcorrupt",
+        "-err_detect", "ignore_err",
+        "-i", src,
+        "-ac", "1", "-ar", str(sr),
+        "-f", fmt, "pipe:1",
+    ]
+
+
+def ffmpeg_decode(data: bytes, sr: int = SAMPLE_RATE, fmt: str = "f32le", suffix: str | None = None) -> bytes:
+    """Tolerant ffmpeg transcode of encoded bytes to mono PCM (fmt: f32le, s16le or wav) at sr."""
+    proc = subprocess.run(_ffmpeg_cmd("pipe:0", sr, fmt), input=data, capture_output=True)
+    if proc.returncode == 0 and proc.stdout:
+        return proc.stdout
+
+    if (suffix or "").lower() in _NEEDS_SEEK:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+            tmp.write(data)
+            tmp_path = tmp.name
+        try:
+            return subprocess.run(_ffmpeg_cmd(tmp_path, sr, fmt), capture_output=True, check=True).stdout
+        finally:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    raise subprocess.CalledProcessError(proc.returncode, "ffmpeg", output=proc.stdout, stderr=proc.stderr)
+
+
+def decode_to_float32(data: bytes, sr: int = SAMPLE_RATE, suffix: str | None = None) -> np.ndarray:
+    """Encoded bytes -> mono float32 waveform in [-1, 1] at sr."""
+    pcm = ffmpeg_decode(data, sr=sr, fmt="f32le", suffix=suffix)
+    return np.frombuffer(pcm, dtype="<f4").copy()
+
+
+def decode_to_segment(data: bytes, sr: int = SAMPLE_RATE, suffix: str | None = None) -> AudioSegment:
+    """Encoded bytes -> mono 16-bit AudioSegment at sr."""
+    pcm = ffmpeg_decode(data, sr=sr, fmt="s16le", suffix=suffix)
+    return AudioSegment(data=pcm, sample_width=2, frame_rate=sr, channels=1)
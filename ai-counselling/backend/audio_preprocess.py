@@ -0,0 +1,192 @@
+# audio_preprocess.py
+"""
+Vectorized speech preprocessing on float32 NumPy arrays.
+
+Same chain as the old pydub version (high-pass 100 Hz, low-pass 8 kHz,
+normalize, compress -20 dB / 4:1 / 5 ms / 50 ms), without pydub's
+per-sample Python loops and per-step copies:
+- the filters are pydub's first-order RC filters, run through scipy's lfilter
+  (same output up to float rounding, since pydub rounds to int samples);
+- normalize is pydub's peak normalize with 0.1 dB headroom;
+- the compressor keeps pydub's RMS detector, gain law and attack/release/hold
+  behaviour, stepping the attenuation every 0.5 ms instead of every sample
+  (within 2e-2 max abs / 1% RMS of pydub; see tests/test_audio_preprocess.py).
+Long inputs are processed in blocks, so scratch memory stays bounded and
+everything returned is float32.
+"""
+import math
+
+import numpy as np
+from pydub import AudioSegment
+from scipy.signal import lfilter
+
+SAMPLE_RATE = 16000
+
+
+# Samples per block: the filters and the compressor work through long inputs
+# in blocks of this size, so their float64 scratch stays bounded.
+BLOCK = 1 << 16
+
+
+def _lfilter_blocks(b, a, y: np.ndarray, zi) -> np.ndarray:
+    """lfilter over y in BLOCK-sized pieces (state carried across), float32 out."""
+    out = np.empty_like(y)
+    for start in range(0, len(y), BLOCK):
+        part, zi = lfilter(b, a, y[start:start + BLOCK], zi=zi)
+        out[start:start + BLOCK] = part
+    return out
+
+
+def high_pass(y: np.ndarray, sr: int, cutoff: float = 100.0) -> np.ndarray:
+    """pydub.effects.high_pass_filter: y[n] = a * (y[n-1] + x[n] - x[n-1]), y[0] = x[0]."""
+    if y.size == 0:
+        return y
+    rc = 1.0 / (cutoff * 2 * math.pi)
+    dt = 1.0 / sr
+    alpha = rc / (rc + dt)
+    return _lfilter_blocks([alpha, -alpha], [1.0, -alpha], y, [(1.0 - alpha) * float(y[0])])
+
+
+def low_pass(y: np.ndarray, sr: int, cutoff: float = 8000.0) -> np.ndarray:
+    """pydub.effects.low_pass_filter: y[n] = y[n-1] + a * (x[n] - y[n-1]), y[0] = x[0]."""
+    if y.size == 0:
+        return y
+    rc = 1.0 / (cutoff * 2 * math.pi)
+    dt = 1.0 / sr
+    alpha = dt / (rc + dt)
+    return _lfilter_blocks([alpha], [1.0, -(1.0 - alpha)], y, [(1.0 - alpha) * float(y[0])])
+
+
+def normalize(y: np.ndarray, headroom_db: float = 0.1) -> np.ndarray:
+    """Scale so the peak sits headroom_db below full scale (silence is returned unchanged)."""
+    peak = float(np.max(np.abs(y))) if y.size else 0.0
+    if peak == 0.0:
+        return y
+    target = 10 ** (-headroom_db / 20)
+    return (y * (target / peak)).astype(np.float32, copy=False)
+
+
+def _attenuation(target: np.ndarray, rise: np.ndarray, fall: np.ndarray) -> np.ndarray:
+    """
+    Run a[k] = min(a[k-1] + rise[k], max(a[k-1] - fall[k], target[k])), a[-1] = 0.
+
+    The steps are cut into ~sqrt(n) segments that run side by side as columns,
+    each from a guessed start; every pass restarts each segment from where
+    its left neighbour ended, until no start changes. Runs started from
+    different values coincide once both are clamped to the target, so this
+    takes a few passes, and the result is the same as the sequential loop.
+    """
+    n = len(target)
+    if n == 0:
+        return target
+    seg = max(64, math.isqrt(n))
+    cols = -(-n // seg)
+    pad = cols * seg - n
+
+    def grid(x):
+        # zero rise and fall is the identity step, so padding doesn't move the last segment
+        return np.ascontiguousarray(np.pad(x, (0, pad)).reshape(cols, seg).T)
+
+    t, up, down = grid(target), grid(rise), grid(fall)
+    out = np.empty_like(t)
+    start = np.zeros(cols)
+    while True:
+        a = start
+        for k in range(seg):
+            a = np.minimum(a + up[k], np.maximum(a - down[k], t[k]))
+            out[k] = a
+        ends = np.concatenate(([0.0], out[-1, :-1]))
+        if np.array_equal(ends, start):
+            return out.T.reshape(-1)[:n]
+        start = ends
+
+
+def compress(y: np.ndarray, sr: int, threshold: float = -20.0, ratio: float = 4.0,
+             attack: float = 5.0, release: float = 50.0, hop_ms: float = 0.5) -> np.ndarray:
+    """
+    pydub.effects.compress_dynamic_range: RMS of the preceding `attack` ms
+    against the threshold, 1 - 1/ratio of the excess in dB as the target
+    attenuation. Attenuation rises by target/attack_frames per sample (capped
+    at the target), falls by target/release_frames while above the target, and
+    holds while the signal is below threshold. The attenuation is stepped once
+    per hop_ms (not per sample), solved for all hops at once (_attenuation) and
+    interpolated back. The detector and the gain run in BLOCK-sized pieces.
+    On speech the output stays within 2e-2 (max abs) and 1% RMS of pydub, the
+    tolerance tests/test_audio_preprocess.py checks.
+    """
+    if y.size == 0:
+        return y
+    thresh_ms = 10 ** (threshold / 10)
+    look = max(int(sr * attack / 1000), 1)
+    hop = max(int(sr * hop_ms / 1000), 1)
+    block = max(BLOCK // hop, 1) * hop
+    n_hops = -(-len(y) // hop)
+
+    # Per hop: samples above threshold and the sum of their target attenuation
+    live = np.zeros(n_hops)
+    total = np.zeros(n_hops)
+    for start in range(0, len(y), block):
+        stop = min(start + block, len(y))
+        base = max(start - look, 0)
+        # mean square over y[i-look:i] for every i in the block, from one cumulative
+        # sum (zero-padded in front, so the first `look` samples need no special case)
+        cs = np.concatenate((np.zeros(look - (start - base) + 1),
+                             np.cumsum(np.square(y[base:stop], dtype=np.float64))))
+        count = look if start >= look else np.clip(np.arange(start, stop), 1, look)
+        ms = (cs[look:look + stop - start] - cs[:stop - start]) / count
+        above = ms > thresh_ms
+        # 20*log10(rms / thresh_rms), only where it is positive
+        target = np.log10(ms / thresh_ms, out=np.zeros_like(ms), where=above)
+        target *= (1.0 - 1.0 / ratio) * 10
+        hops = slice(start // hop, -(-stop // hop))
+        pad = (hops.stop - hops.start) * hop - (stop - start)
+        live[hops] = np.pad(above, (0, pad)).reshape(-1, hop).sum(axis=1)
+        total[hops] = np.pad(target, (0, pad)).reshape(-1, hop).sum(axis=1)
+
+    # Below threshold pydub's step is 0 and the attenuation holds, so only live
+    # hops are solved; the rest carry the last live value forward.
+    on = np.flatnonzero(live)
+    hop_target = total[on] / live[on]
+    a = _attenuation(hop_target, live[on] * hop_target / (sr * attack / 1000),
+                     live[on] * hop_target / (sr * release / 1000))
+    last = np.cumsum(live > 0) - 1
+    att = np.where(last >= 0, a[np.maximum(last, 0)] if len(a) else 0.0, 0.0)
+    del live, total, hop_target, a, last
+
+    out = np.empty_like(y)
+    ends = np.arange(n_hops) * hop + hop - 1
+    for start in range(0, len(y), block):
+        stop = min(start + block, len(y))
+        # hops ending in [start - hop, stop + hop) cover every interpolation point of the block
+        h0, h1 = max(start // hop - 1, 0), min(-(-stop // hop) + 1, n_hops)
+        gain_db = np.interp(np.arange(start, stop), ends[h0:h1], att[h0:h1])
+        gain_db *= -math.log(10) / 20
+        out[start:stop] = y[start:stop] * np.exp(gain_db)
+    return out
+
+
+def preprocess_array(y: np.ndarray, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """High-pass, low-pass, normalize, compress. Mono float32 in, mono float32 out."""
+    y = np.asarray(y, dtype=np.float32)
+    y = high_pass(y, sr, cutoff=100)
+    y = low_pass(y, sr, cutoff=8000)
+    y = normalize(y)
+    y = compress(y, sr, threshold=-20.0, ratio=4.0, attack=5, release=50)
+    return y
+
+
+def segment_to_array(seg: AudioSegment, sr: int = SAMPLE_RATE) -> np.ndarray:
+    """AudioSegment -> mono float32 in [-1, 1] at sr."""
+    seg = seg.set_channels(1).set_frame_rate(sr).set_sample_width(2)
+    return np.frombuffer(seg.raw_data, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def array_to_segment(y: np.ndarray, sr: int = SAMPLE_RATE) -> AudioSegment:
+    """Mono float32 in [-1, 1] -> 16-bit AudioSegment."""
+    pcm = np.clip(np.round(y * 32767.0), -32768, 32767).astype("<i2")
+    return AudioSegment(data=pcm.tobytes(), sample_width=2, frame_rate=sr, channels=1)
+
+
+def preprocess_segment(seg: AudioSegment, sr: int = SAMPLE_RATE) -> AudioSegment:
+    """Drop-in replacement for the old pydub chain: AudioSegment in, 16 kHz mono AudioSegment out."""
+    return array_to_segment(preprocess_array(segment_to_array(seg, sr), sr), sr)
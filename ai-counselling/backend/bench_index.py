@@ -0,0 +1,84 @@
+# bench_index.py
+"""
+Recall vs latency of the approximate index types against the exact flat index.
+
+    python bench_index.py --embeddings document_embeddings.npy --k 5
+
+Queries are corpus embeddings with a little gaussian noise (stand-ins for
+real questions that land near a chunk); ground truth is IndexFlatIP's top-k.
+Each approximate index is swept over its query-time knob (nprobe / efSearch)
+and reports recall@k, per-query p50/p95 latency and serialized index size.
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from corpus import build_index, configure_search, default_nlist
+
+
+def _queries(emb: np.ndarray, n: int, noise: float, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    q = emb[rng.choice(len(emb), size=min(n, len(emb)), replace=False)].copy()
+    q += rng.normal(scale=noise, size=q.shape).astype(np.float32)
+    faiss.normalize_L2(q)
+    return q
+
+
+def _timed_search(index, q: np.ndarray, k: int):
+    lat, ids = [], []
+    for row in q:
+        started = time.perf_counter()
+        _, I = index.search(row[None, :], k)
+        lat.append((time.perf_counter() - started) * 1000)
+        ids.append(I[0])
+    return np.array(ids), np.array(lat)
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def _row(name, knob, found, truth, lat, size):
+    print(f"{name:<6} {knob:<14} recall@k={_recall(found, truth):.3f}  "
+          f"p50={np.percentile(lat, 50):.3f}ms  p95={np.percentile(lat, 95):.3f}ms  size={size / 1e6:.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--embeddings", default="document_embeddings.npy")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--pq-m", type=int, default=48)
+    args = parser.parse_args()
+
+    emb = np.ascontiguousarray(np.load(args.embeddings), dtype=np.float32)
+    faiss.normalize_L2(emb)
+    q = _queries(emb, args.queries, args.noise)
+    print(f"{emb.shape[0]} vectors, dim {emb.shape[1]}, {len(q)} queries, k={args.k}")
+
+    flat, _ = build_index(emb, "flat")
+    truth, lat = _timed_search(flat, q, args.k)
+    _row("flat", "-", truth, truth, lat, len(faiss.serialize_index(flat)))
+
+    nlist = default_nlist(len(emb))
+    probes = sorted({p for p in (1, 2, 4, 8, 16, 32, 64) if p <= nlist} | {nlist})
+    for kind, opts in (("ivf", {}), ("ivfpq", {"pq_m": args.pq_m})):
+        index, _ = build_index(emb, kind, nlist=nlist, **opts)
+        size = len(faiss.serialize_index(index))
+        for p in probes:
+            found, lat = _timed_search(configure_search(index, nprobe=p), q, args.k)
+            _row(kind, f"nprobe={p}/{nlist}", found, truth, lat, size)
+
+    index, _ = build_index(emb, "hnsw")
+    size = len(faiss.serialize_index(index))
+    for ef in (16, 32, 64, 128, 256):
+        found, lat = _timed_search(configure_search(index, ef_search=ef), q, args.k)
+        _row("hnsw", f"efSearch={ef}", found, truth, lat, size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+Offline benchmarks for the backend pipelines.
+
+Run from backend/:
+
+    python -m benchmarks.stages            # per-stage latency, throughput, peak RSS
+    python -m benchmarks.load --in-process # concurrent load, p50/p95/p99 per endpoint
+    python -m benchmarks.load --url http://localhost:8000
+
+Everything external is replaced locally: S3 by moto, MongoDB by mongomock,
+Gemini by generation.FakeBackend, Google ASR by transcription.StubBackend and
+the sentence encoder by a hashing embedder. The emotion models (wav2vec2,
+DeepFace) are the real ones, since they are what the numbers are about.
+Extra packages for the benchmarks only: moto, mongomock, httpx.
+"""
@@ -0,0 +1,136 @@
+# benchmarks/fixtures.py
+"""
+Synthetic inputs: speech-like audio frames, video clips and an embedding corpus.
+Deterministic for a given seed, so runs are comparable.
+"""
+import io
+import shutil
+import subprocess
+import wave
+import zlib
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def speech_like(duration_s: float, sr: int = SAMPLE_RATE, seed: int = 0) -> np.ndarray:
+    """
+    Voiced "syllables" (harmonics of a wandering F0 under two formant bumps,
+    ~4 Hz syllable envelope) separated by pauses, over a low noise floor.
+    Enough structure to pass the VAD gate and exercise the emotion model.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration_s * sr)
+    t = np.arange(n) / sr
+    f0 = 140 + 40 * np.sin(2 * np.pi * 0.3 * t + rng.uniform(0, np.pi)) + rng.normal(0, 3, n).cumsum() / sr * 50
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    formants = (rng.uniform(500, 800), rng.uniform(1200, 2200))
+    y = np.zeros(n)
+    for h in range(1, 25):
+        fh = h * f0.mean()
+        weight = sum(np.exp(-((fh - f) / 250.0) ** 2) for f in formants) + 0.05
+        y += weight / h * np.sin(h * phase)
+    syllables = np.clip(np.sin(2 * np.pi * 4.0 * t), 0, None) ** 2
+    pauses = (np.sin(2 * np.pi * 0.25 * t + rng.uniform(0, np.pi)) > -0.6).astype(float)
+    y = y * syllables * pauses
+    y = 0.3 * y / (np.abs(y).max() + 1e-9) + rng.normal(0, 0.003, n)
+    return y.astype(np.float32)
+
+
+def wav_bytes(y: np.ndarray, sr: int = SAMPLE_RATE) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes((np.clip(y, -1, 1) * 32767).astype("<i2").tobytes())
+    return buf.getvalue()
+
+
+def webm_bytes(y: np.ndarray, sr: int = SAMPLE_RATE) -> bytes | None:
+    """Opus/WebM like the browser recorder produces; None when ffmpeg is missing."""
+    if not shutil.which("ffmpeg"):
+        return None
+    proc = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "wav", "-i", "pipe:0",
+         "-c:a", "libopus", "-b:a", "32k", "-f", "webm", "pipe:1"],
+        input=wav_bytes(y, sr), capture_output=True, check=True,
+    )
+    return proc.stdout
+
+
+def audio_frames(count: int, frame_s: float = 5.0, fmt: str = "webm", seed: int = 0) -> list[tuple[str, bytes]]:
+    """(extension, bytes) per recorder frame; falls back to WAV without ffmpeg."""
+    out = []
+    for i in range(count):
+        y = speech_like(frame_s, seed=seed + i)
+        data = webm_bytes(y) if fmt == "webm" else None
+        out.append((".webm", data) if data is not None else (".wav", wav_bytes(y)))
+    return out
+
+
+def video_clip(path: str, seconds: float = 10.0, fps: int = 30, size=(640, 480), seed: int = 0) -> str:
+    """A drifting cartoon face on a noisy background, written with OpenCV (mp4v)."""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    w, h = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    try:
+        for i in range(int(seconds * fps)):
+            frame = rng.integers(60, 90, size=(h, w, 3), dtype=np.uint8)
+            cx = int(w / 2 + w / 5 * np.sin(i / fps))
+            cy = int(h / 2 + h / 8 * np.cos(i / fps / 2))
+            cv2.ellipse(frame, (cx, cy), (70, 90), 0, 0, 360, (150, 180, 220), -1)
+            for dx in (-25, 25):
+                cv2.circle(frame, (cx + dx, cy - 20), 8, (40, 40, 40), -1)
+            cv2.ellipse(frame, (cx, cy + 35), (25, 10), 0, 0, 180, (60, 60, 160), 3)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
+
+
+_TOPICS = ["sleep", "anxiety", "mood", "appetite", "panic", "grief", "stress", "focus", "trauma", "energy"]
+
+
+def corpus_texts(n: int, seed: int = 0) -> list[str]:
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in range(n):
+        topic, other = rng.choice(_TOPICS, size=2, replace=False)
+        out.append(f"Section {i}. Persistent {topic} problems often appear with changes in {other}. "
+                   f"Clinicians ask about onset, duration and how {topic} affects daily functioning.")
+    return out
+
+
+class HashEmbedder:
+    """
+    Stand-in for SentenceTransformer: bag of hashed word/bigram features,
+    L2-normalized. Cheap, deterministic, and similar texts land close together.
+    """
+
+    def __init__(self, name: str = "hash-embedder", dim: int = 768):
+        self.name = name
+        self.dim = dim
+
+    def encode(self, texts, convert_to_numpy=True, batch_size=None, show_progress_bar=False, **_):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = text.lower().split()
+            for tok in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                h = zlib.crc32(tok.encode())
+                out[row, h % self.dim] += 1.0 if (h >> 20) & 1 else -1.0
+        out /= np.linalg.norm(out, axis=1, keepdims=True) + 1e-9
+        return out
+
+
+def embedding_corpus(out_dir: str, n_chunks: int = 2000, index_type: str = "flat", seed: int = 0) -> dict:
+    """Build a corpus artifact (see corpus.py) from synthetic passages; returns its manifest."""
+    from corpus import write_corpus
+
+    texts = corpus_texts(n_chunks, seed)
+    embedder = HashEmbedder()
+    return write_corpus(out_dir, texts, embedder.encode(texts), embedder.name,
+                        {"source": "synthetic", "chunker": "synthetic"}, index_type)
@@ -0,0 +1,60 @@
+# benchmarks/harness.py
+"""Timing, percentile and RSS helpers shared by the stage and load benchmarks."""
+import json
+import resource
+import sys
+import time
+
+import numpy as np
+
+
+def peak_rss_mb() -> float:
+    """Process high-water RSS (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(name: str, latencies_s: list[float], wall_s: float, errors: int = 0, **extra) -> dict:
+    ms = np.asarray(latencies_s, dtype=np.float64) * 1000
+    n = len(ms)
+    return {
+        "name": name,
+        "n": n,
+        "errors": errors,
+        "mean_ms": round(float(ms.mean()), 2) if n else None,
+        "p50_ms": round(float(np.percentile(ms, 50)), 2) if n else None,
+        "p95_ms": round(float(np.percentile(ms, 95)), 2) if n else None,
+        "p99_ms": round(float(np.percentile(ms, 99)), 2) if n else None,
+        "throughput_per_s": round(n / wall_s, 2) if wall_s > 0 else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        **extra,
+    }
+
+
+def measure(name: str, fn, iterations: int = 10, warmup: int = 1, **extra) -> dict:
+    """Run fn() sequentially; the warmup calls (model loads, caches) are not counted."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(name, latencies, time.perf_counter() - started, **extra)
+
+
+COLUMNS = ("name", "n", "errors", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "throughput_per_s", "peak_rss_mb")
+
+
+def print_table(rows: list[dict], columns=COLUMNS):
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for r in rows:
+        print("  ".join(str(r.get(c, "")).ljust(widths[c]) for c in columns))
+
+
+def write_json(rows: list[dict], path: str):
+    with open(path, "w") as f:
+        json.dump(rows, f, indent=2)
+    print(f"wrote {path}")
@@ -0,0 +1,151 @@
+# benchmarks/load.py
+"""
+Concurrent load against the API: p50/p95/p99, requests/s and error count per
+endpoint. Streaming endpoints also report time to first byte.
+
+    python -m benchmarks.load --in-process [--concurrency 8] [--requests 200]
+    python -m benchmarks.load --url http://localhost:8000 --user <clerk_user_id>
+
+--in-process drives main2.app through httpx's ASGI transport inside an
+offline_world (moto, mongomock, fake LLM, stub ASR). --url hits a running
+server as-is, so its numbers include whatever backends that server uses.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import fixtures, harness, stubs
+
+ENDPOINTS = ("respond", "respond_stream", "process_speech", "detect_video_emotions")
+
+
+def _requests(name: str, users, video: bytes | None):
+    """Endless (method, path, kwargs, streaming) for one endpoint."""
+    topics = itertools.cycle(fixtures._TOPICS)
+    for i, user in enumerate(itertools.cycle(users)):
+        msg = f"I keep struggling with {next(topics)} ({i})"
+        if name == "respond":
+            yield "POST", "/respond", {"params": {"msg": msg, "user_id": user}}, False
+        elif name == "respond_stream":
+            yield "POST", "/respond/stream", {"params": {"msg": msg, "user_id": user}}, True
+        elif name == "process_speech":
+            yield "GET", "/process_speech", {"params": {"userid": user}}, False
+        elif name == "detect_video_emotions":
+            yield "POST", "/detect_video_emotions", {
+                "params": {"user_id": user, "filename": "clip.mp4"},
+                "content": video, "headers": {"content-type": "video/mp4"},
+            }, False
+
+
+async def _one(client: httpx.AsyncClient, method, path, kwargs, streaming):
+    """(ok, latency_s, ttfb_s)"""
+    started = time.perf_counter()
+    if not streaming:
+        resp = await client.request(method, path, **kwargs)
+        elapsed = time.perf_counter() - started
+        return resp.status_code < 400, elapsed, elapsed
+    ttfb = None
+    async with client.stream(method, path, **kwargs) as resp:
+        async for _ in resp.aiter_bytes():
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+        ok = resp.status_code < 400
+    elapsed = time.perf_counter() - started
+    return ok, elapsed, ttfb if ttfb is not None else elapsed
+
+
+async def run_endpoint(client, name, users, video, total: int, concurrency: int) -> dict:
+    plan = _requests(name, users, video)
+    latencies, ttfbs, errors = [], [], 0
+    lock = asyncio.Lock()
+
+    async def worker():
+        nonlocal errors
+        while True:
+            async with lock:
+                if len(latencies) + errors >= total:
+                    return
+                method, path, kwargs, streaming = next(plan)
+            try:
+                ok, elapsed, ttfb = await _one(client, method, path, kwargs, streaming)
+            except httpx.HTTPError:
+                ok, elapsed, ttfb = False, 0.0, 0.0
+            async with lock:
+                if ok:
+                    latencies.append(elapsed)
+                    ttfbs.append(ttfb)
+                else:
+                    errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    row = harness.summarize(name, latencies, time.perf_counter() - started, errors, concurrency=concurrency)
+    if name.endswith("_stream") and ttfbs:
+        row["ttfb_p50_ms"] = harness.summarize(name, ttfbs, 1.0)["p50_ms"]
+    return row
+
+
+async def run(args, users, video, transport=None) -> list[dict]:
+    base_url = args.url or "http://bench"
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, timeout=args.timeout) as client:
+        rows = []
+        for name in args.endpoints:
+            if name == "detect_video_emotions" and video is None:
+                print("skipping detect_video_emotions (no clip: pass --video or install opencv)")
+                continue
+            print(f"loading {name}: {args.requests} requests, concurrency {args.concurrency} ...")
+            rows.append(await run_endpoint(client, name, users, video, args.requests, args.concurrency))
+        return rows
+
+
+def _video(args, tmp) -> bytes | None:
+    path = args.video
+    if not path:
+        try:
+            path = fixtures.video_clip(os.path.join(tmp, "clip.mp4"), seconds=args.video_seconds)
+        except ImportError:
+            return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Concurrent API load test")
+    target = ap.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="base URL of a running server")
+    target.add_argument("--in-process", action="store_true", help="drive main2.app offline over ASGI")
+    ap.add_argument("--user", action="append", help="user id(s) for --url runs")
+    ap.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=100, help="per endpoint")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--video", help="video file to upload (default: synthetic clip)")
+    ap.add_argument("--video-seconds", type=float, default=10.0)
+    ap.add_argument("--json", help="also write results to this file")
+    args = ap.parse_args(argv)
+    args.endpoints = args.endpoints.split(",")
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        ap.error(f"unknown endpoint(s): {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = _video(args, tmp) if "detect_video_emotions" in args.endpoints else None
+        if args.in_process:
+            with stubs.offline_world() as (users, _):
+                transport = httpx.ASGITransport(app=stubs.load_app().app)
+                rows = asyncio.run(run(args, users, video, transport))
+        else:
+            rows = asyncio.run(run(args, args.user or ["user_bench_0"], video))
+
+    harness.print_table(rows, harness.COLUMNS + ("ttfb_p50_ms",))
+    if args.json:
+        harness.write_json(rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
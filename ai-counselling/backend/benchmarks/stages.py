@@ -0,0 +1,124 @@
+# benchmarks/stages.py
+"""
+Per-stage latency, throughput and peak RSS, offline.
+
+    python -m benchmarks.stages [--only preprocess,vad,...] [--iterations N] [--json out.json]
+"""
+import argparse
+import itertools
+import os
+import tempfile
+
+from benchmarks import fixtures, harness, stubs
+
+STAGES = ("preprocess", "vad", "tone_array", "tone_file", "s3_frames", "transcribe", "retrieve")
+
+
+def bench_preprocess(ctx, iterations):
+    from audio_preprocess import preprocess_array
+
+    y = fixtures.speech_like(30.0)
+    return harness.measure("preprocess_array (30 s)", lambda: preprocess_array(y), iterations,
+                           audio_s_per_call=30.0)
+
+
+def bench_vad(ctx, iterations):
+    from process_audio_tone import _frame_windows
+    from vad import speech_window_mask
+
+    y = fixtures.speech_like(30.0)
+    windows, starts, _ = _frame_windows(y, fixtures.SAMPLE_RATE)
+    return harness.measure("speech_window_mask (30 s)",
+                           lambda: speech_window_mask(y, fixtures.SAMPLE_RATE, starts, windows.shape[1]),
+                           iterations, windows=len(starts))
+
+
+def bench_tone_array(ctx, iterations):
+    from process_audio_tone import analyze_audio_array
+
+    y = fixtures.speech_like(15.0)
+    return harness.measure("analyze_audio_array (15 s)",
+                           lambda: analyze_audio_array(y, fixtures.SAMPLE_RATE), iterations)
+
+
+def bench_tone_file(ctx, iterations):
+    from process_audio_tone import EnsembleEmotionRecognizer
+
+    recognizer = EnsembleEmotionRecognizer()
+    path = os.path.join(ctx["tmp"], "tone.wav")
+    with open(path, "wb") as f:
+        f.write(fixtures.wav_bytes(fixtures.speech_like(15.0)))
+    return harness.measure("EnsembleEmotionRecognizer.process_audio (15 s wav)",
+                           lambda: recognizer.process_audio(path), iterations)
+
+
+def bench_s3_frames(ctx, iterations):
+    from process_audio_tone import SpeechProcessor
+
+    processor = SpeechProcessor()
+    users = itertools.cycle(ctx["users"])
+    return harness.measure(
+        f"process_s3_frames ({ctx['frames']} frames, moto)",
+        lambda: processor.process_s3_frames(stubs.BUCKET, f"{next(users)}/"), iterations,
+    )
+
+
+def bench_transcribe(ctx, iterations):
+    from speech_to_text import transcribe_latest_concat
+
+    users = itertools.cycle(ctx["users"])
+    return harness.measure(
+        "transcribe_latest_concat (k=3, moto + mongomock, stub ASR)",
+        lambda: transcribe_latest_concat(stubs.BUCKET, k=3, user_id=next(users)), iterations,
+    )
+
+
+def bench_retrieve(ctx, iterations):
+    main2 = stubs.load_app()
+    # distinct queries, so this measures encode + search rather than the result cache
+    queries = (f"{t} has been bad for {i} weeks" for i, t in enumerate(itertools.cycle(fixtures._TOPICS)))
+    return harness.measure(f"retrieve_chunks ({ctx['corpus_chunks']} chunks)",
+                           lambda: main2.retrieve_chunks(next(queries)), iterations)
+
+
+BENCHES = {
+    "preprocess": bench_preprocess,
+    "vad": bench_vad,
+    "tone_array": bench_tone_array,
+    "tone_file": bench_tone_file,
+    "s3_frames": bench_s3_frames,
+    "transcribe": bench_transcribe,
+    "retrieve": bench_retrieve,
+}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Per-stage backend benchmarks (offline)")
+    ap.add_argument("--only", help=f"comma-separated subset of: {','.join(STAGES)}")
+    ap.add_argument("--iterations", type=int, default=10)
+    ap.add_argument("--users", type=int, default=4)
+    ap.add_argument("--frames", type=int, default=12, help="recorder frames seeded per user")
+    ap.add_argument("--corpus-chunks", type=int, default=2000)
+    ap.add_argument("--json", help="also write results to this file")
+    args = ap.parse_args(argv)
+
+    selected = args.only.split(",") if args.only else list(STAGES)
+    unknown = set(selected) - set(BENCHES)
+    if unknown:
+        ap.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+
+    rows = []
+    with stubs.offline_world(args.users, args.frames, args.corpus_chunks) as (users, _), \
+            tempfile.TemporaryDirectory() as tmp:
+        ctx = {"users": users, "frames": args.frames, "corpus_chunks": args.corpus_chunks, "tmp": tmp}
+        for name in selected:
+            print(f"running {name} ...")
+            rows.append(BENCHES[name](ctx, args.iterations))
+
+    harness.print_table(rows)
+    if args.json:
+        harness.write_json(rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
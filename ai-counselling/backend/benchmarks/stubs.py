@@ -0,0 +1,132 @@
+# benchmarks/stubs.py
+"""
+Local stand-ins for the external services, plus the seeded world the
+benchmarks run against (one bucket, a few users with recorder frames,
+their audio_frames rows and questionnaire docs).
+"""
+import os
+import sys
+import tempfile
+import time
+import types
+from contextlib import contextmanager
+
+from benchmarks import fixtures
+
+BUCKET = "bench-bucket"
+
+
+def offline_env(**overrides):
+    """Env for a fully offline run; must be applied before importing backend modules."""
+    env = {
+        "DEFAULT_BUCKET": BUCKET,
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_REGION": "us-east-1",
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "LLM_BACKEND": "fake",
+        "ASR_BACKEND": "stub",
+        "ASR_STUB_TEXT": "lately I have been feeling anxious and I cannot sleep",
+        "MODEL_WARMUP": "0",
+    }
+    env.update(overrides)
+    for k, v in env.items():
+        os.environ.setdefault(k, v)
+
+
+def patch_sentence_transformer():
+    """Make `from sentence_transformers import SentenceTransformer` return HashEmbedder."""
+    try:
+        import sentence_transformers
+    except ImportError:
+        sentence_transformers = types.ModuleType("sentence_transformers")
+        sys.modules["sentence_transformers"] = sentence_transformers
+    sentence_transformers.SentenceTransformer = fixtures.HashEmbedder
+
+
+@contextmanager
+def fake_s3():
+    """moto-backed S3 with BUCKET created; the shared S3Access is rebuilt inside the mock."""
+    import boto3
+    from moto import mock_aws
+
+    import s3_access
+
+    with mock_aws():
+        client = boto3.client("s3", region_name=os.environ.get("AWS_REGION", "us-east-1"))
+        client.create_bucket(Bucket=BUCKET)
+        previous = s3_access._shared
+        s3_access._shared = None
+        try:
+            yield client
+        finally:
+            s3_access._shared = previous
+
+
+@contextmanager
+def fake_mongo():
+    """mongomock in place of the fetcher's client (sync path; Motor is bypassed)."""
+    import mongomock
+
+    import mongodb_fetcher
+
+    saved = (mongodb_fetcher.client, mongodb_fetcher.db, mongodb_fetcher._motor_db)
+    client = mongomock.MongoClient()
+    mongodb_fetcher.client = client
+    mongodb_fetcher.db = client[mongodb_fetcher.mongo_db]
+    mongodb_fetcher._motor_db = lambda: None
+    mongodb_fetcher.profiles.clear()
+    try:
+        yield mongodb_fetcher.db
+    finally:
+        mongodb_fetcher.client, mongodb_fetcher.db, mongodb_fetcher._motor_db = saved
+
+
+def seed_user(s3_client, db, user_id: str, frames: int = 6, frame_s: float = 5.0, seed: int = 0) -> list[str]:
+    """
+    Upload recorder frames where both pipelines look for them: <user>/ for tone
+    analysis and users/<user>/audio/webm/ (via audio_frames rows) for ASR.
+    """
+    keys = []
+    now_ms = int(time.time() * 1000)
+    for i, (ext, data) in enumerate(fixtures.audio_frames(frames, frame_s, seed=seed)):
+        ts_ms = now_ms - (frames - i) * 5000
+        # unpadded counters, as the upload routes write them (frame_10 sorts before frame_9 as a string)
+        for key in (f"{user_id}/audio/frame_{i}_clip{ext}", f"users/{user_id}/audio/webm/frame_{i}_{ts_ms}{ext}"):
+            s3_client.put_object(Bucket=BUCKET, Key=key, Body=data)
+        keys.append(key)
+        db["audio_frames"].insert_one({
+            "clerk_user_id": user_id, "s3Key": key, "bytes": len(data), "ts_ms": ts_ms,
+        })
+    db["users"].insert_one({
+        "clerk_user_id": user_id, "email": f"{user_id}@example.com", "onboarded": True,
+        "onboarding": {"mode": "voice", "concerns": ["sleep", "anxiety"], "crossCutting": {"anxiety": 3, "sleepProblems": 3}},
+    })
+    return keys
+
+
+@contextmanager
+def offline_world(users: int = 4, frames: int = 12, corpus_chunks: int = 2000):
+    """
+    Everything the app needs, offline: env, moto S3 + mongomock seeded with
+    `users` users, and a synthetic corpus artifact in CORPUS_DIR.
+    Yields (user_ids, corpus_dir).
+    """
+    offline_env()
+    patch_sentence_transformer()
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = os.path.join(tmp, "corpus")
+        fixtures.embedding_corpus(corpus_dir, corpus_chunks)
+        os.environ["CORPUS_DIR"] = corpus_dir
+        with fake_s3() as s3_client, fake_mongo() as db:
+            user_ids = [f"user_bench_{i}" for i in range(users)]
+            for i, uid in enumerate(user_ids):
+                seed_user(s3_client, db, uid, frames=frames, seed=100 * i)
+            yield user_ids, corpus_dir
+
+
+def load_app():
+    """Import main2 inside an offline_world (corpus, stubs and env already in place)."""
+    import main2
+
+    return main2
@@ -0,0 +1,186 @@
+# cache.py
+"""
+Small caches for repeated work (query embeddings, retrieval results, ...).
+
+TTLCache is an in-process LRU with per-entry TTL and hit/miss counters.
+Passing a DiskCache adds a second tier in a SQLite file, so several uvicorn
+workers on one host share entries; the disk tier is best-effort and any
+error there is treated as a miss.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+# name -> cache, for /caches and metrics
+caches = {}
+
+
+def all_stats() -> dict:
+    return {name: c.stats() for name, c in caches.items()}
+
+
+class DiskCache:
+    """Pickled values in a SQLite table with expiry; one connection per thread."""
+
+    def __init__(self, path: str, max_rows: int = 100_000, prune_every: int = 500):
+        self.path = path
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._writes = 0
+        with self._conn() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=1.0, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, key: str):
+        row = self._conn().execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return _MISSING
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value, ttl_s: float):
+        with self._conn() as db:
+            db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                       (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time() + ttl_s))
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def delete(self, key: str):
+        with self._conn() as db:
+            db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def prune(self):
+        with self._conn() as db:
+            db.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+            db.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                       (self.max_rows,))
+
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int = 1024, ttl_s: float = 3600.0, disk: DiskCache | None = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.disk = disk
+        self._data = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        caches[name] = self
+
+    @classmethod
+    def from_env(cls, name: str, maxsize: int = 1024, ttl_s: float = 3600.0):
+        """
+        Overridable per cache, e.g. CACHE_QUERY_EMBEDDING_SIZE / _TTL_S.
+        CACHE_DB=<path> turns on the shared SQLite tier for every cache built here.
+        """
+        prefix = f"CACHE_{name.upper()}"
+        db_path = os.getenv("CACHE_DB")
+        disk = None
+        if db_path:
+            try:
+                disk = DiskCache(db_path)
+            except sqlite3.Error as e:
+                print(f"[cache {name}] disk tier disabled: {e}")
+        return cls(
+            name,
+            int(os.getenv(f"{prefix}_SIZE", str(maxsize))),
+            float(os.getenv(f"{prefix}_TTL_S", str(ttl_s))),
+            disk,
+        )
+
+    def _disk_key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+
+    def get(self, key: str, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] >= now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._data[key]
+
+        if self.disk is not None:
+            try:
+                value = self.disk.get(self._disk_key(key))
+            except sqlite3.Error:
+                value = _MISSING
+            if value is not _MISSING:
+                with self._lock:
+                    self.disk_hits += 1
+                self._put(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def _put(self, key: str, value):
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def set(self, key: str, value):
+        self._put(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(self._disk_key(key), value, self.ttl_s)
+            except sqlite3.Error as e:
+                print(f"[cache {self.name}] disk write failed: {e}")
+
+    def get_or_compute(self, key: str, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+        if self.disk is not None:
+            try:
+                self.disk.delete(self._disk_key(key))
+            except sqlite3.Error:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "disk": self.disk.path if self.disk is not None else None,
+            }
@@ -0,0 +1,179 @@
+# chunking.py
+"""
+Sentence- and heading-aware chunking for the corpus build.
+
+Input is PDF text as PyPDF2 extracts it: hard-wrapped lines, pages separated
+by form feeds. Page furniture (page numbers, running headers and footers) is
+dropped and wrapped lines are joined before headings are detected, so a
+wrapped sentence never passes for a heading. Headings start a new chunk, and
+the heading path (e.g. disorder name > "Diagnostic Criteria") is repeated at
+the top of every chunk of the section, so each chunk embeds with its
+context. Sentences are packed up to max_tokens, and the last overlap_tokens
+worth of sentences are carried into the next chunk of the same section.
+Token counts are the usual ~4 characters per token estimate.
+"""
+import math
+import re
+from collections import Counter
+
+DEFAULT_MAX_TOKENS = 200
+DEFAULT_OVERLAP_TOKENS = 40
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+_HEADING = re.compile(r"^(?:[A-Z][A-Za-z0-9&/,'()\- ]{2,80}|[0-9]+(?:\.[0-9]+)*\.?\s+\S.{0,78})$")
+_NUMBERED = re.compile(r"^([0-9]+(?:\.[0-9]+)*)\.?\s+(.+)$")
+_PAGE_NUMBER = re.compile(r"^(?:page\s+)?[0-9]+(?:\s+(?:of|/)\s+[0-9]+)?$", re.IGNORECASE)
+# a line ending in one of these continues on the next line
+_CONNECTIVES = frozenset(
+    "a an and are as at be by for from in into is of on or that the to was were which with".split())
+# a first/last page line (digits ignored) seen on this many pages is a running header/footer
+RUNNING_LINE_PAGES = 3
+
+
+def approx_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / 4)) if text else 0
+
+
+def _title_like(words: list[str]) -> bool:
+    return len(words) <= 8 and all(w[0].isupper() or not w[0].isalpha() or len(w) <= 3 for w in words)
+
+
+def is_heading(line: str) -> bool:
+    """
+    Short line without closing punctuation: ALL CAPS, Title Case, or a
+    section number ("2.", "3.1") followed by a Title Case title. Page numbers
+    and lines ending in a connective ("... as indicated by") are not headings.
+    """
+    line = line.strip()
+    if not line or len(line) > 80 or line[-1] in ".,;:!?" or not _HEADING.match(line):
+        return False
+    words = line.split()
+    if _PAGE_NUMBER.match(line) or words[-1].lower() in _CONNECTIVES:
+        return False
+    numbered = _NUMBERED.match(line)
+    if numbered:
+        return _title_like(numbered.group(2).split())
+    if line.isupper():
+        return len(words) <= 10
+    return _title_like(words)
+
+
+def heading_level(heading: str) -> int:
+    """ALL CAPS headings are outermost, then numbered ones by depth, then Title Case."""
+    numbered = _NUMBERED.match(heading)
+    if numbered:
+        return 2 + numbered.group(1).count(".")
+    return 1 if heading.isupper() else 9
+
+
+def split_sentences(text: str) -> list[str]:
+    text = " ".join(text.split())
+    return [s for s in _SENTENCE_END.split(text) if s]
+
+
+def _running_key(line: str) -> str:
+    return " ".join(re.sub(r"[0-9]+", " ", line).split()).lower()
+
+
+def strip_page_furniture(text: str) -> list[str]:
+    """
+    Lines of text without page numbers and running headers/footers (a first
+    or last page line that, digits aside, repeats on RUNNING_LINE_PAGES pages).
+    Pages are separated by form feeds; blank lines are kept as paragraph breaks.
+    """
+    pages = [[ln.strip() for ln in page.split("\n")] for page in text.split("\f")]
+    edges = Counter()
+    for page in pages:
+        filled = [ln for ln in page if ln and not _PAGE_NUMBER.match(ln)]
+        edges.update({_running_key(ln) for ln in filled[:1] + filled[-1:]})
+    running = {k for k, n in edges.items() if k and n >= RUNNING_LINE_PAGES}
+
+    lines = []
+    for page in pages:
+        filled = [i for i, ln in enumerate(page) if ln and not _PAGE_NUMBER.match(ln)]
+        edge = {i for i in filled[:1] + filled[-1:] if _running_key(page[i]) in running}
+        lines.extend(ln for i, ln in enumerate(page) if i not in edge and not _PAGE_NUMBER.match(ln))
+    return lines
+
+
+def _continues(prev: str, line: str) -> bool:
+    """Whether line is the hard-wrapped continuation of prev."""
+    if prev[-1] in ".!?:":
+        return False
+    if prev.isupper() and line.isupper():  # a long ALL CAPS title wrapped over two lines
+        return len(prev) + len(line) < 80
+    return line[0].islower() or line[0] in ",;)" or prev[-1] in ",;-(" or prev.split()[-1].lower() in _CONNECTIVES
+
+
+def logical_lines(text: str) -> list[str]:
+    """Page furniture dropped and hard-wrapped lines joined; "" marks a paragraph break."""
+    out = []
+    for line in strip_page_furniture(text):
+        if line and out and out[-1] and _continues(out[-1], line):
+            out[-1] = f"{out[-1]} {line}"
+        else:
+            out.append(line)
+    return out
+
+
+def sections(text: str) -> list[tuple[str, str]]:
+    """
+    (heading path, body) pairs; the path joins the enclosing headings with
+    newlines, outermost first. Text before the first heading gets heading "".
+    """
+    out, path, body = [], [], []
+    for line in logical_lines(text):
+        if is_heading(line):
+            if body:
+                out.append(("\n".join(h for _, h in path), "\n".join(body)))
+            level = heading_level(line)
+            path = [(lv, h) for lv, h in path if lv < level] + [(level, line)]
+            body = []
+        elif line:
+            body.append(line)
+    if body:
+        out.append(("\n".join(h for _, h in path), "\n".join(body)))
+    return out
+
+
+def _split_long(sentence: str, max_tokens: int) -> list[str]:
+    words, parts, cur = sentence.split(), [], []
+    for w in words:
+        if cur and approx_tokens(" ".join(cur + [w])) > max_tokens:
+            parts.append(" ".join(cur))
+            cur = []
+        cur.append(w)
+    if cur:
+        parts.append(" ".join(cur))
+    return parts
+
+
+def chunk_text(text: str, max_tokens: int = DEFAULT_MAX_TOKENS, overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> list[str]:
+    chunks = []
+    for heading, body in sections(text):
+        prefix = f"{heading}\n" if heading else ""
+        budget = max(16, max_tokens - approx_tokens(prefix))
+        sentences = []
+        for s in split_sentences(body):
+            sentences.extend(_split_long(s, budget) if approx_tokens(s) > budget else [s])
+
+        cur, cur_tokens, fresh = [], 0, 0  # fresh: sentences not carried over from the previous chunk
+        for s in sentences:
+            t = approx_tokens(s)
+            if cur and cur_tokens + t > budget:
+                chunks.append(prefix + " ".join(cur))
+                # carry the tail sentences forward as overlap
+                carry, carry_tokens = [], 0
+                for prev in reversed(cur):
+                    pt = approx_tokens(prev)
+                    if carry_tokens + pt > overlap_tokens or carry_tokens + pt + t > budget:
+                        break
+                    carry.insert(0, prev)
+                    carry_tokens += pt
+                cur, cur_tokens, fresh = carry, carry_tokens, 0
+            cur.append(s)
+            cur_tokens += t
+            fresh += 1
+        if cur and fresh:
+            chunks.append(prefix + " ".join(cur))
+    return chunks
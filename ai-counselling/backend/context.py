@@ -0,0 +1,75 @@
+# context.py
+"""
+Turn retrieved candidates into the DSM-5 context block of a prompt.
+
+select_passages drops candidates under a similarity cutoff, then picks up to
+max_passages with MMR (relevance vs. redundancy with what is already picked),
+skipping near-duplicates outright. fit_to_budget then packs the picked
+passages into a token budget, trimming the last one at a sentence boundary.
+"""
+import os
+
+import numpy as np
+
+from chunking import approx_tokens, split_sentences
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.25"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+DUPLICATE_SIM = float(os.getenv("DUPLICATE_SIM", "0.95"))
+MIN_TRIM_TOKENS = 40
+
+
+def select_passages(q_emb: np.ndarray, ids: list[int], embeddings: np.ndarray, max_passages: int,
+                    min_score: float = RETRIEVAL_MIN_SCORE, mmr_lambda: float = MMR_LAMBDA,
+                    duplicate_sim: float = DUPLICATE_SIM) -> list[int]:
+    """
+    Chunk ids in prompt order. embeddings are the corpus' L2-normalized
+    vectors, so dot products are cosine similarities.
+    """
+    if not ids:
+        return []
+    cand = np.asarray(embeddings[np.asarray(ids)], dtype=np.float32)
+    rel = cand @ np.asarray(q_emb, dtype=np.float32)
+    keep = rel >= min_score
+    ids = [i for i, k in zip(ids, keep) if k]
+    cand, rel = cand[keep], rel[keep]
+    if not ids:
+        return []
+
+    sim = cand @ cand.T
+    chosen = []
+    remaining = list(range(len(ids)))
+    while remaining and len(chosen) < max_passages:
+        if chosen:
+            redundancy = sim[np.ix_(remaining, chosen)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+        scores = mmr_lambda * rel[remaining] - (1 - mmr_lambda) * redundancy
+        best = int(np.argmax(scores))
+        pick = remaining.pop(best)
+        if chosen and redundancy[best] >= duplicate_sim:
+            continue
+        chosen.append(pick)
+    return [ids[c] for c in chosen]
+
+
+def fit_to_budget(passages: list[str], token_budget: int = CONTEXT_TOKEN_BUDGET) -> list[str]:
+    out, used = [], 0
+    for p in passages:
+        t = approx_tokens(p)
+        if used + t <= token_budget:
+            out.append(p)
+            used += t
+            continue
+        left = token_budget - used
+        if left >= MIN_TRIM_TOKENS:
+            trimmed = []
+            for s in split_sentences(p):
+                if approx_tokens(" ".join(trimmed + [s])) > left:
+                    break
+                trimmed.append(s)
+            if trimmed:
+                out.append(" ".join(trimmed))
+        break
+    return out
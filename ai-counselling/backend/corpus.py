@@ -0,0 +1,329 @@
+# corpus.py
+"""
+Versioned, memory-mappable retrieval corpus.
+
+Built offline (python corpus.py build ...), loaded by the server at startup
+without parsing the PDF. Layout of a corpus directory:
+
+    chunks.bin      UTF-8 chunk texts, concatenated
+    offsets.npy     int64 byte offsets into chunks.bin (n_chunks + 1)
+    embeddings.npy  float32 L2-normalized chunk embeddings (n_chunks, dim)
+    index.faiss     FAISS index over embeddings
+    manifest.json   format version, model, chunking params, per-file sha256
+                    and a corpus_hash tying chunks and embeddings together
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import time
+
+import faiss
+import numpy as np
+
+from chunking import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS, chunk_text
+
+FORMAT_VERSION = 1
+DEFAULT_MODEL = "all-mpnet-base-v2"
+DEFAULT_CHUNK_SIZE = 300
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+# Query-time knobs for approximate indexes; unset keeps what the build recorded
+FAISS_NPROBE = os.getenv("FAISS_NPROBE")
+FAISS_EF_SEARCH = os.getenv("FAISS_EF_SEARCH")
+
+FILES = ("chunks.bin", "offsets.npy", "embeddings.npy", "index.faiss")
+
+
+class CorpusError(RuntimeError):
+    pass
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _corpus_hash(file_hashes: dict, model: str) -> str:
+    h = hashlib.sha256()
+    for name in ("chunks.bin", "offsets.npy", "embeddings.npy"):
+        h.update(file_hashes[name].encode())
+    h.update(model.encode())
+    return h.hexdigest()
+
+
+# ------------------------------ build ------------------------------
+
+def extract_pdf_text(pdf_path: str) -> str:
+    import PyPDF2
+
+    text = ""
+    with open(pdf_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        for page in reader.pages:
+            page_text = page.extract_text()
+            if page_text:
+                # form feed between pages: chunking drops page headers/footers per page
+                text += page_text + "\f"
+    return text
+
+
+def chunk_words(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> list[str]:
+    """Fixed-size word windows (the original chunking; matches the legacy document_embeddings.npy)."""
+    words = text.split()
+    return [" ".join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
+
+
+def default_nlist(n: int) -> int:
+    # ~4*sqrt(n) lists, but keep >= 39 training points per centroid (faiss warns below that)
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+
+def build_index(embeddings: np.ndarray, kind: str = "flat", nlist: int | None = None,
+                hnsw_m: int = 32, pq_m: int = 48, pq_bits: int = 8):
+    """
+    Inner-product index over L2-normalized embeddings (i.e. cosine).
+    flat: exact scan. ivf: inverted lists, scans nprobe of nlist cells.
+    hnsw: graph search, tuned by efSearch. ivfpq: ivf with product-quantized
+    codes (pq_m sub-vectors of pq_bits each; pq_m must divide the dim).
+    Returns (index, params) where params are recorded in the manifest.
+    """
+    n, d = embeddings.shape
+    ip = faiss.METRIC_INNER_PRODUCT
+    if kind == "flat":
+        index, params = faiss.IndexFlatIP(d), {}
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(d, hnsw_m, ip)
+        index.hnsw.efConstruction = max(40, 2 * hnsw_m)
+        index.hnsw.efSearch = 64
+        params = {"m": hnsw_m, "ef_construction": index.hnsw.efConstruction, "ef_search": index.hnsw.efSearch}
+    elif kind in ("ivf", "ivfpq"):
+        nlist = nlist or default_nlist(n)
+        quantizer = faiss.IndexFlatIP(d)
+        if kind == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist, ip)
+            params = {"nlist": nlist}
+        else:
+            if d % pq_m:
+                raise CorpusError(f"pq_m={pq_m} must divide the embedding dim {d}")
+            # each sub-quantizer needs >= 39 points per centroid; shrink codebooks for small corpora
+            pq_bits = max(1, min(pq_bits, int(np.log2(max(n // 39, 2)))))
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, pq_m, pq_bits, ip)
+            params = {"nlist": nlist, "pq_m": pq_m, "pq_bits": pq_bits}
+        index.train(embeddings)
+        index.nprobe = max(1, nlist // 8)
+        params["nprobe"] = index.nprobe
+    else:
+        raise CorpusError(f"Unknown index type {kind!r}; expected one of {INDEX_TYPES}")
+    index.add(embeddings)
+    return index, {"type": kind, **params}
+
+
+def configure_search(index, nprobe: int | None = None, ef_search: int | None = None):
+    """Apply query-time search params to whatever index type was loaded."""
+    if nprobe is not None:
+        try:
+            faiss.extract_index_ivf(index).nprobe = int(nprobe)
+        except RuntimeError:
+            pass  # not an IVF index
+    if ef_search is not None and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = int(ef_search)
+    return index
+
+
+def write_corpus(out_dir: str, chunks: list[str], embeddings: np.ndarray, model: str, params: dict,
+                 index_type: str = "flat", **index_options) -> dict:
+    """Write an artifact directory for chunks/embeddings and return its manifest."""
+    if len(chunks) != embeddings.shape[0]:
+        raise CorpusError(f"{len(chunks)} chunks but {embeddings.shape[0]} embeddings")
+
+    os.makedirs(out_dir, exist_ok=True)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    faiss.normalize_L2(embeddings)
+
+    encoded = [c.encode("utf-8") for c in chunks]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    with open(os.path.join(out_dir, "chunks.bin"), "wb") as f:
+        for b in encoded:
+            f.write(b)
+    np.save(os.path.join(out_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(out_dir, "embeddings.npy"), embeddings)
+    index, index_params = build_index(embeddings, index_type, **index_options)
+    faiss.write_index(index, os.path.join(out_dir, "index.faiss"))
+
+    file_hashes = {name: _sha256(os.path.join(out_dir, name)) for name in FILES}
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "model": model,
+        "n_chunks": len(chunks),
+        "dim": int(embeddings.shape[1]),
+        "params": params,
+        "index": index_params,
+        "files": file_hashes,
+        "corpus_hash": _corpus_hash(file_hashes, model),
+        "built_at": int(time.time()),
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def build_corpus(pdf_path: str, out_dir: str, model: str = DEFAULT_MODEL, chunker: str = "sentences",
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, max_tokens: int = DEFAULT_MAX_TOKENS,
+                 overlap_tokens: int = DEFAULT_OVERLAP_TOKENS, embeddings_path: str | None = None,
+                 index_type: str = "flat", **index_options) -> dict:
+    """
+    Parse the PDF, chunk it and embed the chunks (or reuse a precomputed .npy,
+    which must have exactly one row per chunk, i.e. the legacy "words" chunker).
+    """
+    text = extract_pdf_text(pdf_path)
+    if chunker == "words":
+        chunks = chunk_words(text, chunk_size)
+        params = {"source": os.path.basename(pdf_path), "chunker": "words", "chunk_size": chunk_size}
+    elif chunker == "sentences":
+        chunks = chunk_text(text, max_tokens, overlap_tokens)
+        params = {"source": os.path.basename(pdf_path), "chunker": "sentences",
+                  "max_tokens": max_tokens, "overlap_tokens": overlap_tokens}
+    else:
+        raise CorpusError(f"Unknown chunker {chunker!r}")
+    if embeddings_path:
+        embeddings = np.load(embeddings_path).astype(np.float32)
+        if embeddings.shape[0] != len(chunks):
+            raise CorpusError(
+                f"{embeddings_path} has {embeddings.shape[0]} rows but the PDF yields {len(chunks)} chunks; "
+                "re-embed instead of reusing it"
+            )
+    else:
+        from sentence_transformers import SentenceTransformer
+
+        embeddings = SentenceTransformer(model).encode(chunks, convert_to_numpy=True, show_progress_bar=True)
+
+    return write_corpus(out_dir, chunks, embeddings, model, params, index_type, **index_options)
+
+
+# ------------------------------ load ------------------------------
+
+class ChunkStore:
+    """Read-only, mmap-backed list of chunk texts."""
+
+    def __init__(self, chunks_path: str, offsets_path: str):
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        self._file = open(chunks_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._mm[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class Corpus:
+    def __init__(self, path: str, manifest: dict, chunks: ChunkStore, embeddings: np.ndarray, index):
+        self.path = path
+        self.manifest = manifest
+        self.chunks = chunks
+        self.embeddings = embeddings
+        self.index = index
+
+    @property
+    def model(self) -> str:
+        return self.manifest["model"]
+
+
+def _read_index(path: str):
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        # not every index type supports mmap reads
+        return faiss.read_index(path)
+
+
+def load_corpus(path: str, verify_hashes: bool = False, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH) -> Corpus:
+    """
+    mmap a corpus directory. Shapes and counts are always cross-checked; with
+    verify_hashes the file contents are re-hashed against the manifest too.
+    Any mismatch raises CorpusError instead of serving wrong chunks.
+    nprobe / ef_search (FAISS_NPROBE / FAISS_EF_SEARCH) override the
+    build-time search params of IVF / HNSW indexes.
+    """
+    manifest_path = os.path.join(path, "manifest.json")
+    if not os.path.exists(manifest_path):
+        raise CorpusError(f"No corpus at {path!r}; build one with: python corpus.py build --pdf DSM5.pdf --out {path}")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise CorpusError(f"Corpus format {manifest.get('format_version')} != {FORMAT_VERSION}; rebuild it")
+
+    if verify_hashes:
+        for name, expected in manifest["files"].items():
+            if _sha256(os.path.join(path, name)) != expected:
+                raise CorpusError(f"{name} does not match manifest hash")
+        if _corpus_hash(manifest["files"], manifest["model"]) != manifest["corpus_hash"]:
+            raise CorpusError("corpus_hash does not match manifest files")
+
+    chunks = ChunkStore(os.path.join(path, "chunks.bin"), os.path.join(path, "offsets.npy"))
+    embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+    index = configure_search(_read_index(os.path.join(path, "index.faiss")), nprobe, ef_search)
+
+    n = manifest["n_chunks"]
+    if not (len(chunks) == n == embeddings.shape[0] == index.ntotal):
+        raise CorpusError(
+            f"Corpus mismatch: manifest {n}, chunks {len(chunks)}, embeddings {embeddings.shape[0]}, index {index.ntotal}"
+        )
+    if embeddings.shape[1] != manifest["dim"] or index.d != manifest["dim"]:
+        raise CorpusError(f"Corpus dim mismatch: manifest {manifest['dim']}, embeddings {embeddings.shape[1]}, index {index.d}")
+
+    return Corpus(path, manifest, chunks, embeddings, index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or check the retrieval corpus artifact.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("build", help="parse, chunk, embed and write a corpus directory")
+    b.add_argument("--pdf", default="DSM5.pdf")
+    b.add_argument("--out", default="corpus")
+    b.add_argument("--model", default=DEFAULT_MODEL)
+    b.add_argument("--chunker", choices=("sentences", "words"), default="sentences")
+    b.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="words per chunk (words chunker)")
+    b.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS, help="tokens per chunk (sentences chunker)")
+    b.add_argument("--overlap-tokens", type=int, default=DEFAULT_OVERLAP_TOKENS)
+    b.add_argument("--embeddings", help="reuse a precomputed .npy (must match the chunk count)")
+    b.add_argument("--index", choices=INDEX_TYPES, default="flat")
+    b.add_argument("--nlist", type=int, help="ivf/ivfpq cells (default ~4*sqrt(n))")
+    b.add_argument("--hnsw-m", type=int, default=32)
+    b.add_argument("--pq-m", type=int, default=48)
+    b.add_argument("--pq-bits", type=int, default=8)
+
+    v = sub.add_parser("verify", help="re-hash a corpus directory against its manifest")
+    v.add_argument("path", nargs="?", default="corpus")
+
+    args = parser.parse_args()
+    if args.cmd == "build":
+        m = build_corpus(args.pdf, args.out, model=args.model, chunker=args.chunker, chunk_size=args.chunk_size,
+                         max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens,
+                         embeddings_path=args.embeddings, index_type=args.index, nlist=args.nlist,
+                         hnsw_m=args.hnsw_m, pq_m=args.pq_m, pq_bits=args.pq_bits)
+        print(f"Wrote {args.out}: {m['n_chunks']} chunks, dim {m['dim']}, index {m['index']}, "
+              f"hash {m['corpus_hash'][:12]}")
+    else:
+        c = load_corpus(args.path, verify_hashes=True)
+        print(f"OK {args.path}: {len(c.chunks)} chunks, hash {c.manifest['corpus_hash'][:12]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# crisis_screen.py
+"""
+Crisis-language screening with a compiled Aho–Corasick automaton.
+
+Text and patterns go through the same normalization (NFKC, lowercase,
+apostrophes dropped, every run of non-word characters -> one space). A
+pattern must start at a word boundary but may end inside a word, so
+inflections still hit: "Self-harmed", "overdosed" and "suicides" match
+"self harm", "overdose" and "suicide", while "skill myself" does not hit
+"kill myself". A phrase written with a trailing "$" must end on a word
+boundary too ("want to die$" skips "want to diet"). Inflected words before
+the last one ("harmed myself") are listed explicitly. One pass over the
+text finds every pattern.
+
+PartialScreen screens transcript chunks as they are recognized, so callers
+can stop the remaining work on the first hit.
+"""
+import os
+import re
+import threading
+import unicodedata
+from collections import deque
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+# verb forms for "<verb> myself" phrases
+_SELF_ACTS = {
+    "kill": ("kill", "kills", "killing", "killed"),
+    "hurt": ("hurt", "hurts", "hurting"),
+    "harm": ("harm", "harms", "harming", "harmed"),
+    "cut": ("cut", "cuts", "cutting"),
+}
+
+CRISIS_PHRASES = [
+    "suicide", "suicidal",
+    "end my life", "ending my life", "ended my life", "end it all", "ending it all", "ended it all",
+    "take my own life", "take my life", "taking my own life", "taking my life",
+    "want to die$", "wanna die$", "wanting to die$", "better off dead", "no reason to live",
+    "dont want to live", "dont wanna live",
+    "self harm", "selfharm",
+    "overdose", "overdosing",
+]
+CRISIS_PHRASES += [f"{form} myself" for forms in _SELF_ACTS.values() for form in forms]
+CRISIS_PHRASES += [t.strip() for t in os.getenv("CRISIS_EXTRA_TERMS", "").split(",") if t.strip()]
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = text.replace("'", "").replace("’", "")
+    return _NON_WORD.sub(" ", text).strip()
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: build once, then one O(len(text) + matches) pass per text."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for p in patterns:
+            self._insert(p)
+        self._link()
+
+    def _insert(self, pattern: str):
+        state = 0
+        for ch in pattern:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            state = nxt
+        if pattern not in self.out[state]:
+            self.out[state].append(pattern)
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def finditer(self, text: str):
+        """Yield (start, pattern) for every occurrence, overlaps included."""
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for p in self.out[state]:
+                yield i - len(p) + 1, p
+
+
+class CrisisScreen:
+    def __init__(self, phrases=CRISIS_PHRASES):
+        whole, prefix = set(), set()
+        for p in phrases:
+            text = normalize(p.rstrip("$"))
+            if text:
+                (whole if p.endswith("$") else prefix).add(text)
+        self.phrases = sorted(whole | prefix)
+        # text is space-padded: " p " needs both word boundaries, " p" only the left one
+        self._automaton = AhoCorasick([f" {p} " for p in whole] + [f" {p}" for p in prefix])
+
+    def matches(self, text: str) -> list[str]:
+        """Distinct phrases found in text, in order of first occurrence."""
+        found = []
+        for _, p in self._automaton.finditer(f" {normalize(text)} "):
+            p = p.strip()
+            if p not in found:
+                found.append(p)
+        return found
+
+    def is_high_risk(self, text: str) -> bool:
+        return next(self._automaton.finditer(f" {normalize(text)} "), None) is not None
+
+
+_default = CrisisScreen()
+
+
+def is_high_risk(text: str) -> bool:
+    return _default.is_high_risk(text)
+
+
+def matches(text: str) -> list[str]:
+    return _default.matches(text)
+
+
+class PartialScreen:
+    """
+    Screens transcript chunks as they arrive (possibly out of order, from ASR
+    worker threads). feed() returns True once anything matched, which
+    TranscriptionExecutor takes as the signal to stop recognizing.
+    Neighbouring chunks are also screened joined, so a phrase cut by a chunk
+    boundary is still found once both sides are in.
+    """
+
+    def __init__(self, screen: CrisisScreen = _default):
+        self.screen = screen
+        self.hits = []
+        self._texts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def high_risk(self) -> bool:
+        return bool(self.hits)
+
+    def feed(self, index: int, text: str) -> bool:
+        with self._lock:
+            self._texts[index] = text or ""
+            candidates = [self._texts[index]]
+            if index - 1 in self._texts:
+                candidates.append(f"{self._texts[index - 1]} {self._texts[index]}")
+            if index + 1 in self._texts:
+                candidates.append(f"{self._texts[index]} {self._texts[index + 1]}")
+            for t in candidates:
+                for p in self.screen.matches(t):
+                    if p not in self.hits:
+                        self.hits.append(p)
+            return bool(self.hits)
@@ -0,0 +1,102 @@
+# embedding_batcher.py
+"""
+Micro-batching in front of the query encoder and the FAISS index.
+
+Concurrent retrievals used to encode one query each. Callers now submit()
+their query and get a Future; a single worker thread waits up to window_ms
+after the first queued query (or until max_batch are queued), encodes the
+whole batch in one call, runs one batched index.search, and resolves each
+caller's Future with its own (embedding, ids).
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+
+
+class EmbeddingBatcher:
+    def __init__(self, encode, search, window_ms: float = EMBED_BATCH_WINDOW_MS, max_batch: int = EMBED_MAX_BATCH):
+        """
+        encode(list[str]) -> float32 array (n, dim), already L2-normalized.
+        search(array, k) -> (D, I) like faiss Index.search.
+        """
+        self.encode = encode
+        self.search = search
+        self.window_s = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.queries = 0
+        self.max_seen_batch = 0
+        self.encode_ms = 0.0
+
+    def _ensure_worker(self):
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, text: str, top_k: int) -> Future:
+        """Future resolving to (embedding [dim], ids [<= top_k])."""
+        fut = Future()
+        self._ensure_worker()
+        self._queue.put((text, top_k, fut))
+        return fut
+
+    def query(self, text: str, top_k: int, timeout: float | None = None):
+        return self.submit(text, top_k).result(timeout=timeout)
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                started = time.perf_counter()
+                embs = np.ascontiguousarray(self.encode([text for text, _, _ in batch]), dtype=np.float32)
+                self.encode_ms += (time.perf_counter() - started) * 1000
+                _, ids = self.search(embs, max(k for _, k, _ in batch))
+            except Exception as e:
+                for _, _, fut in batch:
+                    fut.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.queries += len(batch)
+            self.max_seen_batch = max(self.max_seen_batch, len(batch))
+            for row, (_, k, fut) in enumerate(batch):
+                fut.set_result((embs[row], [int(i) for i in ids[row][:k] if i >= 0]))
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "max_batch_seen": self.max_seen_batch,
+            "queued": self._queue.qsize(),
+            "window_ms": self.window_s * 1000,
+            "max_batch": self.max_batch,
+            "encode_ms_total": round(self.encode_ms, 1),
+        }
@@ -0,0 +1,133 @@
+# execution.py
+"""
+Execution layer for the FastAPI app: keeps blocking and CPU-heavy work off
+the event loop and sheds load instead of queueing without bound.
+
+- run_io: blocking I/O (S3, Mongo, sync SDKs) on a bounded thread pool.
+- run_inference: picklable model work (e.g. video analysis) on a bounded
+  process pool ("spawn", so workers never inherit TF/torch state from a fork).
+- run_local_inference: model work that must stay in this process (torch
+  releases the GIL; SpeechProcessor keeps per-user state) on its own small
+  thread pool, so it cannot starve I/O threads.
+- EndpointLimiter: per-endpoint concurrency cap with a bounded wait queue;
+  429 when the queue is full, 503 when a queued request waits too long.
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+IO_THREADS = int(os.getenv("IO_THREADS", "32"))
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "2"))
+INFERENCE_PROCESSES = int(os.getenv("INFERENCE_PROCESSES", "2"))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(kind: str):
+    with _pools_lock:
+        if kind not in _pools:
+            if kind == "process":
+                _pools[kind] = ProcessPoolExecutor(
+                    max_workers=INFERENCE_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+                )
+            elif kind == "inference":
+                _pools[kind] = ThreadPoolExecutor(max_workers=INFERENCE_THREADS, thread_name_prefix="inference")
+            else:
+                _pools[kind] = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="io")
+        return _pools[kind]
+
+
+async def _run(kind: str, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool(kind), functools.partial(fn, *args, **kwargs))
+
+
+async def run_io(fn, *args, **kwargs):
+    return await _run("io", fn, *args, **kwargs)
+
+
+async def run_local_inference(fn, *args, **kwargs):
+    return await _run("inference", fn, *args, **kwargs)
+
+
+async def run_inference(fn, *args, **kwargs):
+    return await _run("process", fn, *args, **kwargs)
+
+
+def submit_io(fn, *args, **kwargs) -> Future:
+    """run_io for code already off the event loop; returns a concurrent Future."""
+    return _pool("io").submit(fn, *args, **kwargs)
+
+
+def submit_inference(fn, *args, **kwargs) -> Future:
+    """run_inference for code already off the event loop; returns a concurrent Future."""
+    return _pool("process").submit(fn, *args, **kwargs)
+
+
+def shutdown():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
+
+
+class EndpointLimiter:
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout_s: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._sem = asyncio.Semaphore(max_concurrent)
+
+    @classmethod
+    def from_env(cls, name: str, max_concurrent: int, max_queue: int, queue_timeout_s: float = 30.0):
+        """Limits overridable per endpoint, e.g. LIMIT_PROCESS_SPEECH_CONCURRENCY / _QUEUE / _TIMEOUT_S."""
+        prefix = f"LIMIT_{name.upper()}"
+        return cls(
+            name,
+            int(os.getenv(f"{prefix}_CONCURRENCY", str(max_concurrent))),
+            int(os.getenv(f"{prefix}_QUEUE", str(max_queue))),
+            float(os.getenv(f"{prefix}_TIMEOUT_S", str(queue_timeout_s))),
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._sem.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=429, detail=f"{self.name} is busy, retry shortly",
+                                headers={"Retry-After": "1"})
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail=f"{self.name} queue timed out",
+                                headers={"Retry-After": "5"})
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._sem.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+        }
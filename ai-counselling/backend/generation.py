@@ -0,0 +1,186 @@
+# generation.py
+"""
+LLM generation with response caching and in-flight coalescing.
+
+Identical prompts (a double-click, a retry) share one backend call while it
+is running, and completed responses are cached by sha256(model + prompt)
+in a TTLCache. Every call is bounded by LLM_TIMEOUT_S. The backend is any
+object with `name`, `async generate(prompt) -> str` and an async-generator
+`stream(prompt)` yielding text pieces; LLM_BACKEND=fake
+swaps Gemini for an offline stand-in for tests and benchmarks.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+import google.generativeai as genai
+
+from cache import TTLCache
+import metrics
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+
+
+class GeminiBackend:
+    def __init__(self, model_name: str = LLM_MODEL):
+        self.name = model_name
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = genai.GenerativeModel(self.name)
+        return self._model
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        return (response.text or "").strip()
+
+    async def stream(self, prompt: str):
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # a chunk without text parts (e.g. only a finish reason / safety block)
+                continue
+            if text:
+                yield text
+
+
+class FakeBackend:
+    """Offline backend: canned reply after LLM_FAKE_DELAY_MS, no network."""
+
+    def __init__(self, text: str | None = None, delay_s: float | None = None):
+        self.name = "fake"
+        self.text = os.getenv("LLM_FAKE_TEXT", "I hear you. Let's take this one step at a time.") if text is None else text
+        self.delay_s = float(os.getenv("LLM_FAKE_DELAY_MS", "200")) / 1000 if delay_s is None else delay_s
+        self.calls = 0
+
+    async def generate(self, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.delay_s)
+        return self.text
+
+    async def stream(self, prompt: str):
+        self.calls += 1
+        words = self.text.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.delay_s / len(words))
+            yield word if i == 0 else " " + word
+
+
+BACKENDS = {"gemini": GeminiBackend, "fake": FakeBackend}
+
+
+class Generator:
+    def __init__(self, backend=None, cache: TTLCache | None = None, timeout_s: float = LLM_TIMEOUT_S):
+        self.backend = backend or BACKENDS[os.getenv("LLM_BACKEND", "gemini")]()
+        self.cache = cache if cache is not None else TTLCache.from_env("llm_response", maxsize=512, ttl_s=600)
+        self.timeout_s = timeout_s
+        self._inflight = {}  # key -> asyncio.Task
+        self.calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def key(self, prompt: str) -> str:
+        return hashlib.sha256(f"{self.backend.name}\0{prompt}".encode()).hexdigest()
+
+    async def _call(self, key: str, prompt: str) -> str:
+        self.calls += 1
+        try:
+            with metrics.timed("llm"):
+                text = await asyncio.wait_for(self.backend.generate(prompt), timeout=self.timeout_s)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise TimeoutError(f"LLM did not answer within {self.timeout_s:g}s")
+        if text:
+            self.cache.set(key, text)
+        return text
+
+    async def generate(self, prompt: str) -> str:
+        key = self.key(prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call(key, prompt))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: one caller disconnecting must not cancel the call others wait on
+        return await asyncio.shield(task)
+
+    async def stream(self, prompt: str):
+        """
+        Yield the answer as it is generated. Cache hits (and prompts already
+        being generated by a non-streaming call) come back as one piece.
+        LLM_TIMEOUT_S bounds the wait for each piece; the full text is cached.
+        """
+        key = self.key(prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            yield await asyncio.shield(task)
+            return
+
+        self.calls += 1
+        parts = []
+        started = time.perf_counter()
+        pieces = self.backend.stream(prompt)
+        try:
+            while True:
+                try:
+                    piece = await asyncio.wait_for(pieces.__anext__(), timeout=self.timeout_s)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    raise TimeoutError(f"LLM stalled for more than {self.timeout_s:g}s")
+                parts.append(piece)
+                yield piece
+        finally:
+            await pieces.aclose()
+            # includes time the consumer spent between pieces
+            metrics.observe("llm", time.perf_counter() - started)
+        text = "".join(parts).strip()
+        if text:
+            self.cache.set(key, text)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "inflight": len(self._inflight),
+            "timeout_s": self.timeout_s,
+        }
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_generator() -> Generator:
+    """Process-wide generator (backend from LLM_BACKEND)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Generator()
+        return _default
+
+
+def set_backend(backend):
+    """Swap the backend of the shared generator (e.g. FakeBackend in tests)."""
+    get_generator().backend = backend
@@ -1,25 +1,43 @@
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import cv2
-from deepface import DeepFace
-from collections import Counter
-import tempfile
+import asyncio
+import hmac
+import ipaddress
+import json
 import os
+import threading
+import time
 import uvicorn
-import PyPDF2
+import unicodedata
+from concurrent.futures import Future
 from sentence_transformers import SentenceTransformer
 import faiss
-import google.generativeai as genai
 import numpy as np
-import speech_recognition as sr
-from pydub import AudioSegment, effects
-from pydub.effects import high_pass_filter, low_pass_filter, compress_dynamic_range
+import google.generativeai as genai
+from pydub import AudioSegment
+from audio_preprocess import preprocess_segment
 from process_audio_tone import SpeechProcessor
+from model_registry import registry
+from corpus import load_corpus
+import cache
+import metrics
+from cache import TTLCache
+from embedding_batcher import EmbeddingBatcher
+from generation import get_generator
+from context import fit_to_budget, select_passages
+from video_analysis import MODELS as VIDEO_MODELS, NO_FACE, analyze_video_file
+from video_stream import VIDEO_MAX_UPLOAD_BYTES, VIDEO_MAX_UPLOAD_MB, UploadTooLarge, VideoUpload
+import execution
+from execution import EndpointLimiter, run_io, run_inference, run_local_inference
+from orchestration import Stage, StageTimer, StopPipeline, iter_stages, run_stages
+from crisis_screen import PartialScreen, is_high_risk
 from dotenv import load_dotenv
 from speech_to_text import transcribe_latest_concat
+from transcription import get_executor
 from pymongo import MongoClient
-from mongodb_fetcher import fetch_all_from_mongo
+from mongodb_fetcher import fetch_user_profile_async, invalidate_user
+from s3_access import get_s3
 
 app = FastAPI(title="Mental Wellness & Emotion Detection API")
 speech_processor = SpeechProcessor()
@@ -34,133 +52,235 @@ app.add_middleware(
 
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY", ""))
 
-model = genai.GenerativeModel('gemini-2.5-flash')
+# Cached, coalesced, time-bounded LLM calls (LLM_BACKEND=fake for offline runs)
+generator = get_generator()
 load_dotenv()
 default_bucket = os.getenv("DEFAULT_BUCKET", "mhacksforsid")
 
-class EmotionDetector:
-    @staticmethod
-    def detect_emotion(frame):
-        try:
-            result = DeepFace.analyze(frame, actions=['emotion'], enforce_detection=False)
-            return result[0]['dominant_emotion']
-        except:
-            return "No face"
 
-detector = EmotionDetector()
+CORPUS_DIR = os.getenv("CORPUS_DIR", "corpus")
+CORPUS_VERIFY = os.getenv("CORPUS_VERIFY", "0") == "1"
+TOP_K = 5  # max passages in a prompt
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+CHUNK_SEC = 30 
+
+# Prebuilt artifact (python corpus.py build --pdf DSM5.pdf --out corpus):
+# chunks and embeddings are mmapped, the FAISS index is read from disk, and a
+# chunk/embedding/index count mismatch fails here instead of at query time.
+corpus = load_corpus(CORPUS_DIR, verify_hashes=CORPUS_VERIFY)
+chunked_docs = corpus.chunks
+index = corpus.index
+print(f"Corpus {corpus.manifest['corpus_hash'][:12]}: {len(chunked_docs)} chunks, dim {index.d}")
+
+# Query embeddings must come from the model the corpus was built with
+registry.register(
+    "sentence_transformer",
+    lambda: SentenceTransformer(corpus.model),
+    warmup=lambda m: m.encode(["warmup"], convert_to_numpy=True),
+)
+embed_model = registry.get("sentence_transformer")
+
+# Greetings, "I feel anxious" and retries repeat a lot; skip the CPU encode for them
+query_embeddings = TTLCache.from_env("query_embedding", maxsize=2048, ttl_s=24 * 3600)
+query_results = TTLCache.from_env("query_result", maxsize=2048, ttl_s=3600)
 
-CRISIS_TERMS = {"suicide", "kill myself", "end my life", "self harm", "overdose", "hurt myself"}
 
-def is_high_risk(text: str) -> bool:
-    text = (text or "").lower()
-    return any(term in text for term in CRISIS_TERMS)
+def normalize_query(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return " ".join(text.split()).strip(" .!?,;:")
 
 
-PDF_PATH = "DSM5.pdf"
-CHUNK_SIZE = 300
-TOP_K = 5
-CHUNK_SEC = 30 
-LANG = "en-US" 
+def _encode_queries(texts: list[str]) -> np.ndarray:
+    with metrics.timed("embedding"):
+        q_emb = embed_model.encode(texts, convert_to_numpy=True, batch_size=len(texts)).astype(np.float32)
+    faiss.normalize_L2(q_emb)
+    return q_emb
+
+
+def _search_index(q_emb: np.ndarray, k: int):
+    with metrics.timed("faiss_search"):
+        return index.search(q_emb, k)
+
+
+# Concurrent retrievals share one encode + one index.search per few-ms window
+batcher = EmbeddingBatcher(_encode_queries, _search_index)
+
+
+def _search_cached(q_emb: np.ndarray, k: int):
+    _, I = _search_index(q_emb[None, :], k)
+    return q_emb, [int(i) for i in I[0] if i >= 0]
 
-# Load and chunk text
-text = ""
-with open(PDF_PATH, "rb") as f:
-    reader = PyPDF2.PdfReader(f)
-    for page in reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text += page_text + "\n"
 
-words = text.split()
-chunked_docs = [" ".join(words[i:i+CHUNK_SIZE]) for i in range(0, len(words), CHUNK_SIZE)]
+def _search(query: str, k: int) -> Future:
+    """
+    Future of (query embedding, candidate ids); cached embeddings skip the
+    encoder, but their index search still runs on the I/O pool, never on the caller.
+    """
+    emb_key = f"{corpus.model}:{normalize_query(query)}"
+    q_emb = query_embeddings.get(emb_key)
+    if q_emb is not None:
+        return execution.submit_io(_search_cached, q_emb, k)
+
+    out = Future()
+
+    def done(f):
+        if out.cancelled():
+            return
+        if f.exception() is not None:
+            out.set_exception(f.exception())
+            return
+        query_embeddings.set(emb_key, f.result()[0])
+        out.set_result(f.result())
+
+    batcher.submit(query, k).add_done_callback(done)
+    return out
+
+
+def _result_key(query: str, top_k: int) -> str:
+    # chunk ids are cached per corpus build, so a rebuilt corpus never serves stale hits
+    return f"{corpus.manifest['corpus_hash']}:{top_k}:{normalize_query(query)}"
+
 
+def _select(found, top_k: int) -> list[int]:
+    q_emb, candidates = found
+    return select_passages(q_emb, candidates, corpus.embeddings, max_passages=top_k)
 
-embed_model = SentenceTransformer("all-mpnet-base-v2")
 
-doc_embeddings = np.load("document_embeddings.npy")
-faiss.normalize_L2(doc_embeddings)
-print("Embeddings shape:", doc_embeddings.shape)
-print("Total chunks:", len(chunked_docs))
+def _passages(ids: list[int]) -> list[str]:
+    return fit_to_budget([chunked_docs[i] for i in ids if i < len(chunked_docs)])
 
-d = doc_embeddings.shape[1]
-index = faiss.IndexFlatIP(d)
-index.add(doc_embeddings)
 
 def retrieve_chunks(query, top_k=TOP_K):
-    q_emb = embed_model.encode([query], convert_to_numpy=True)
-    faiss.normalize_L2(q_emb)
-    D, I = index.search(q_emb, top_k)
-    return [chunked_docs[i] for i in I[0] if i < len(chunked_docs)]
+    """
+    Up to top_k passages above the score cutoff, de-duplicated with MMR and
+    packed into CONTEXT_TOKEN_BUDGET.
+    """
+    key = _result_key(query, top_k)
+    ids = query_results.get(key)
+    if ids is None:
+        ids = _select(_search(query, max(top_k, RETRIEVAL_CANDIDATES)).result(), top_k)
+        query_results.set(key, ids)
+    return _passages(ids)
+
+
+async def retrieve_chunks_async(query, top_k=TOP_K):
+    """retrieve_chunks without holding a thread while the query waits for its batch."""
+    key = _result_key(query, top_k)
+    ids = query_results.get(key)
+    if ids is None:
+        found = await asyncio.wrap_future(_search(query, max(top_k, RETRIEVAL_CANDIDATES)))
+        ids = _select(found, top_k)
+        query_results.set(key, ids)
+    return _passages(ids)
 
 print("Setup complete.")
 
+
+@app.on_event("startup")
+def warm_models():
+    # Load everything before the first request instead of inside it. Video
+    # models only run in the inference worker processes, so the server skips them.
+    if os.getenv("MODEL_WARMUP", "1") == "1":
+        registry.warmup([name for name in registry.names() if name not in VIDEO_MODELS])
+
+
+@app.get("/models")
+def models():
+    """Load time and memory footprint of each shared model."""
+    return registry.stats()
+
 def preprocess(path: str):
     audio = AudioSegment.from_file(path)
-   
-    audio = audio.set_channels(1).set_frame_rate(16000)
-   
-    audio = high_pass_filter(audio, cutoff=100)     
-    audio = low_pass_filter(audio, cutoff=8000)     
-   
-    audio = effects.normalize(audio)
-    audio = compress_dynamic_range(audio, threshold=-20.0, ratio=4.0, attack=5, release=50)
-    return audio
+    # high/low-pass, normalize, compress on float32 arrays (see audio_preprocess)
+    return preprocess_segment(audio, sr=16000)
 
 def split_chunks(audio: AudioSegment, chunk_sec=CHUNK_SEC):
     step = int(chunk_sec * 1000)
     return [audio[i:i+step] for i in range(0, len(audio), step)]
 
 def speech_to_text(path: str):
-    r = sr.Recognizer()
     audio = preprocess(path)
     chunks = split_chunks(audio)
+    return get_executor().transcribe(chunks)
 
-    texts = []
-    with tempfile.TemporaryDirectory() as td:
-        for i, ch in enumerate(chunks, 1):
-            wav_path = os.path.join(td, f"part_{i}.wav")
-            ch.export(wav_path, format="wav")
-            with sr.AudioFile(wav_path) as source:
-              
-                r.adjust_for_ambient_noise(source, duration=0.3)
-                audio_chunk = r.record(source)
 
-            try:
-                
-                result = r.recognize_google(audio_chunk, language=LANG, show_all=True)
-                if isinstance(result, dict) and "alternative" in result and result["alternative"]:
-                    best = max(result["alternative"], key=lambda a: a.get("confidence", 0))
-                    texts.append(best.get("transcript", "").strip())
-                else:
-                  
-                    txt = r.recognize_google(audio_chunk, language=LANG)
-                    texts.append(txt.strip())
-                print(f"[{i}/{len(chunks)}] ✓")
-            except sr.UnknownValueError:
-                print(f"[{i}/{len(chunks)}] (no speech recognized)")
-            except sr.RequestError as e:
-                raise SystemExit(f"[{i}/{len(chunks)}] API error: {e}")
-    return " ".join(t for t in texts if t).strip()
 
+limits = {
+    "respond": EndpointLimiter.from_env("respond", max_concurrent=16, max_queue=64),
+    "process_speech": EndpointLimiter.from_env("process_speech", max_concurrent=4, max_queue=16),
+    "detect_video_emotions": EndpointLimiter.from_env("detect_video_emotions", max_concurrent=2, max_queue=4),
+}
 
 
-@app.post("/respond")
-def respond(msg, user_id):
-    if is_high_risk(msg):
-        reply = ("I'm really glad you reached out. Your safety matters. "
-                 "If you’re in immediate danger, call your local emergency number now. "
-                 "You can also contact a local crisis line or reach out to someone you trust.")
-        return {"response": {"reply": reply}}
+@app.get("/caches")
+def cache_stats():
+    """Size and hit rate of each in-process cache."""
+    return {**cache.all_stats(), "embedding_batcher": batcher.stats(), "llm": generator.stats()}
 
-    # Retrieve relevant chunks
-    relevant_chunks = retrieve_chunks(msg)
-    context_text = "\n".join(relevant_chunks) if relevant_chunks else "No relevant content found in the document."
+
+# Shared secret for internal endpoints; src/db/users.ts sends it as X-Internal-Token.
+# Unset, those endpoints only answer callers on loopback/private addresses.
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+
+
+def _internal_caller(request: Request) -> bool:
+    if INTERNAL_API_TOKEN:
+        return hmac.compare_digest(request.headers.get("x-internal-token", ""), INTERNAL_API_TOKEN)
     try:
-        questionnaire = fetch_all_from_mongo("users", {"user_id": user_id})
-    except Exception as e:
-        questionnaire = ""
-    # Build prompt for Gemini
-    prompt = f"""
+        addr = ipaddress.ip_address(request.client.host if request.client else "")
+    except ValueError:
+        return False
+    return addr.is_loopback or addr.is_private
+
+
+@app.post("/users/{user_id}/invalidate")
+def invalidate_user_cache(user_id: str, request: Request):
+    """
+    Called by the web app after onboarding/preferences writes so the next prompt
+    sees them. Internal only. Reaches every worker when CACHE_DB is shared;
+    otherwise the other workers' copies expire with the profile TTL.
+    """
+    if not _internal_caller(request):
+        return JSONResponse({"error": "forbidden"}, status_code=403)
+    invalidate_user(user_id)
+    return {"invalidated": user_id}
+
+
+@app.get("/limits")
+def endpoint_limits():
+    """Current concurrency / queue depth per endpoint."""
+    return {name: lim.stats() for name, lim in limits.items()}
+
+
+# Existing in-process stats, exported as gauges on each scrape
+metrics.register_stats("cache", cache.all_stats)
+metrics.register_stats("s3", lambda: get_s3().metrics())
+metrics.register_stats("limiter", endpoint_limits)
+metrics.register_stats("model", registry.stats)
+metrics.register_stats("service", lambda: {"llm": generator.stats(), "embedding_batcher": batcher.stats()})
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Stage latency histograms, frame/window counters and the stats above, Prometheus text format."""
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+
+@app.on_event("shutdown")
+def stop_pools():
+    execution.shutdown()
+
+
+NO_CONTEXT = "No relevant content found in the document."
+
+CRISIS_REPLY = ("I'm really glad you reached out. Your safety matters. "
+                "If you’re in immediate danger, call your local emergency number now. "
+                "You can also contact a local crisis line or reach out to someone you trust.")
+
+
+def _respond_prompt(msg, context_text, questionnaire):
+    return f"""
     Using the following DSM-5 context, answer the user's question:
 
     {context_text}
@@ -170,147 +290,331 @@ def respond(msg, user_id):
     Respond in a concise, empathetic, and supportive way. Focus on genuinely understanding the person's feelings and providing comforting, actionable guidance. Do NOT provide medical advice or suggest contacting health professionals.
 
     """
-    response = model.generate_content(prompt)
-    answer = (response.text or "").strip()
 
-    return {"final_response": answer}
 
-
-@app.post("/detect_video_emotions")
-async def detect_video_emotions(user_id, file: UploadFile = File(...)):
+async def _respond_context(msg, user_id):
+    # Retrieve relevant chunks
+    relevant_chunks = await retrieve_chunks_async(msg)
+    context_text = "\n".join(relevant_chunks) if relevant_chunks else NO_CONTEXT
     try:
-        # Save uploaded file temporarily
-        suffix = os.path.splitext(file.filename)[1]
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(await file.read())
-            tmp_path = tmp.name
-
-        cap = cv2.VideoCapture(tmp_path)
-        if not cap.isOpened():
-            return JSONResponse({"error": "Cannot open video file"}, status_code=400)
-
-        emotions = []
-        frame_count = 0
-
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            emotion = detector.detect_emotion(frame)
-            emotions.append(emotion)
-            frame_count += 1
-
-        cap.release()
-        os.remove(tmp_path)
-
-      
-        final_emotion = Counter(emotions).most_common(1)[0][0] if emotions else "No face detected"
-
-          # Use userid as the prefix in S3
-        analysis, download_ms, file_count, total_bytes = speech_processor.process_s3_frames(
-            bucket=default_bucket,
-            prefix=f"{user_id}/"  # assumes files are under bucket/<userid>/...
-        )
+        questionnaire = await fetch_user_profile_async(user_id)
+    except Exception as e:
+        questionnaire = ""
+    return context_text, questionnaire
 
+
+@app.post("/respond")
+async def respond(msg, user_id):
+    async with limits["respond"].slot():
+        if is_high_risk(msg):
+            return {"response": {"reply": CRISIS_REPLY}}
+
+        context_text, questionnaire = await _respond_context(msg, user_id)
+        answer = await generator.generate(_respond_prompt(msg, context_text, questionnaire))
+
+        return {"final_response": answer}
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class _SlotStreamingResponse(StreamingResponse):
+    """StreamingResponse that gives back its endpoint slot when sending ends, however it ends."""
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
         try:
-            transcript = transcribe_latest_concat(default_bucket, k=3, pool=30)
-            print("Transcript:", transcript)
-            relevant_chunks = retrieve_chunks(transcript)
-            context_text = "\n".join(relevant_chunks) if relevant_chunks else "No relevant content found in the document."
-        except Exception as e:
-            transcript = ""
-            context_text = "No relevant content found in the document."
-           
-      
+            await super().__call__(scope, receive, send)
+        finally:
+            # a disconnect can end sending before (or while) the body runs; close it so
+            # the pipeline behind it stops, then free the slot either way
+            try:
+                await self.body_iterator.aclose()
+            finally:
+                await self._release()
+
+
+async def _sse_response(limiter: EndpointLimiter, events):
+    """
+    Stream server-sent events while holding the endpoint's slot. The slot is
+    taken before the response starts, so overload still surfaces as 429/503,
+    and released by the response itself, also when the client has gone away.
+    """
+    slot = limiter.slot()
+    await slot.__aenter__()
+
+    async def body():
         try:
-            questionnaire = fetch_all_from_mongo("users", {"user_id": user_id})
+            async for event, data in events:
+                yield _sse(event, data)
         except Exception as e:
-            questionnaire = ""
+            yield _sse("error", {"error": str(e)})
+
+    return _SlotStreamingResponse(body(), lambda: slot.__aexit__(None, None, None),
+                                  media_type="text/event-stream",
+                                  headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+async def _stream_answer(prompt, timer, done_payload):
+    started = time.perf_counter()
+    parts = []
+    async for piece in generator.stream(prompt):
+        if not parts:
+            timer.record("llm_first_token", started)
+        parts.append(piece)
+        yield "token", {"text": piece}
+    timer.record("llm", started)
+    yield "done", {**done_payload, "final_response": "".join(parts).strip(), "timings": timer.finish()}
+
+
+@app.post("/respond/stream")
+async def respond_stream(msg, user_id):
+    """/respond as server-sent events: crisis_check, context_ready, token..., done."""
+    async def events():
+        timer = StageTimer()
+        high_risk = is_high_risk(msg)
+        yield "crisis_check", {"high_risk": high_risk}
+        if high_risk:
+            yield "done", {"final_response": CRISIS_REPLY, "timings": timer.finish()}
+            return
+        started = time.perf_counter()
+        context_text, questionnaire = await _respond_context(msg, user_id)
+        timer.record("context", started)
+        yield "context_ready", {"has_context": context_text != NO_CONTEXT}
+        async for event in _stream_answer(_respond_prompt(msg, context_text, questionnaire), timer, {}):
+            yield event
+
+    return await _sse_response(limits["respond"], events())
 
-        prompt = f"""
+
+class CrisisDetected(StopPipeline):
+    def __init__(self, terms):
+        super().__init__("crisis language in transcript")
+        self.terms = terms
+
+
+def _crisis_response(timer, **extra):
+    return {**extra, "crisis": True, "final_response": CRISIS_REPLY, "timings": timer.finish()}
+
+
+def _speech_stages(user_id):
+    """
+    Tone analysis, transcription and the questionnaire lookup are independent;
+    only retrieval waits for the transcript.
+    """
+    async def tone(_):
+        # Cancelling this task does not stop the worker thread; the event makes
+        # process_s3_frames bail out before inference (and before committing state).
+        cancel = threading.Event()
+        try:
+            # Use userid as the prefix in S3
+            return await run_local_inference(
+                speech_processor.process_s3_frames,
+                bucket=default_bucket,
+                prefix=f"{user_id}/",  # assumes files are under bucket/<userid>/...
+                incremental=True,  # only frames added since this user's last call
+                cancel=cancel,
+            )
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+    async def transcript(_):
+        # screened chunk by chunk as ASR returns; a hit stops ASR and every other stage
+        screen = PartialScreen()
+        text = await run_io(transcribe_latest_concat, default_bucket, k=3, pool=30, user_id=user_id,
+                            on_part=screen.feed)
+        print("Transcript:", text)
+        if screen.high_risk or is_high_risk(text):
+            raise CrisisDetected(screen.hits)
+        return text
+
+    async def context(deps):
+        if not deps["transcript"]:
+            return NO_CONTEXT
+        relevant_chunks = await retrieve_chunks_async(deps["transcript"])
+        return "\n".join(relevant_chunks) if relevant_chunks else NO_CONTEXT
+
+    async def questionnaire(_):
+        return await fetch_user_profile_async(user_id)
+
+    return [
+        Stage("tone", tone),
+        Stage("transcript", transcript, fallback=""),
+        Stage("retrieval", context, deps=("transcript",), fallback=NO_CONTEXT),
+        Stage("questionnaire", questionnaire, fallback=""),
+    ]
+
+
+def _speech_prompt(context_text, transcript, analysis, questionnaire, final_emotion=None):
+    if final_emotion is None:
+        emotion_line, understand = "", "tone"
+    else:
+        emotion_line, understand = f'User final detected emotion: "{final_emotion}"\n        ', "tone and emotion"
+    return f"""
         Using the following DSM-5 context, answer the user's question:
 
         {context_text}
 
         User question: "{transcript}"
         User tone analysis: "{analysis}"
-        User final detected emotion: "{final_emotion}"
-        User's previous questionnaire data: "{questionnaire}"
-        Respond in a concise, empathetic, and supportive way. Focus on genuinely understanding the person's feelings and providing comforting, actionable guidance. Understand the user's tone and emotion while responding. Do NOT provide medical advice or suggest contacting health professionals.
+        {emotion_line}User's previous questionnaire data: "{questionnaire}"
+        Respond in a concise, empathetic, and supportive way. Focus on genuinely understanding the person's feelings and providing comforting, actionable guidance. Understand the user's {understand} while responding. Do NOT provide medical advice or suggest contacting health professionals.
 
         """
-        response = model.generate_content(prompt)
-        answer = (response.text or "").strip()
-        return JSONResponse({
-            "emotions_per_frame": emotions,
-            "total_frames": frame_count,
-            "final_emotion": final_emotion,
-            "final_response": answer,
-        })
 
-    except Exception as e:
-        return JSONResponse({"error": str(e)}, status_code=400)
 
-@app.get("/process_speech")
-def process_speech(userid):
+@app.post("/detect_video_emotions")
+async def detect_video_emotions(user_id, request: Request):
     """
-    Process all audio frames in S3 under a prefix matching the user ID.
+    Accepts multipart (field "file") or a raw video body. The upload is
+    spooled in chunks and sampled frames are analyzed while it arrives;
+    uploads over VIDEO_MAX_UPLOAD_MB get a 413.
     """
-    try:
-        # Use userid as the prefix in S3
-        analysis, download_ms, file_count, total_bytes = speech_processor.process_s3_frames(
-            bucket=default_bucket,
-            prefix=f"{userid}/"  # assumes files are under bucket/<userid>/...
-        )
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > VIDEO_MAX_UPLOAD_BYTES:
+        return JSONResponse({"error": f"Upload exceeds {VIDEO_MAX_UPLOAD_MB} MB"}, status_code=413)
+
+    async with limits["detect_video_emotions"].slot():
         try:
-            transcript = transcribe_latest_concat(default_bucket, k=3, pool=30)
-            print("Transcript:", transcript)
-            relevant_chunks = retrieve_chunks(transcript)
-            context_text = "\n".join(relevant_chunks) if relevant_chunks else "No relevant content found in the document."
-            print("Context for Gemini:", context_text)
+            timer = StageTimer()
+            upload = await run_io(VideoUpload, request.headers.get("content-type", ""),
+                                  request.query_params.get("filename", ""))
+
+            async def video(_):
+                started = time.perf_counter()
+                async for chunk in request.stream():
+                    if chunk:
+                        await run_io(upload.write, chunk)
+                spool = await run_io(upload.finish)
+                timer.record("upload", started)
+                labels = await asyncio.wrap_future(spool.labels)
+                if labels is None:
+                    # not decodable from the pipe (or no ffmpeg): OpenCV on the spooled file in a worker process
+                    return await run_inference(analyze_video_file, spool.path)
+                return await run_io(spool.summarize, labels)
+
             try:
-                questionnaire = fetch_all_from_mongo("users", {"user_id": userid})
-            except Exception as e:
-                questionnaire = ""
+                results = await run_stages([Stage("video", video)] + _speech_stages(user_id), timer)
+            except CrisisDetected:
+                return JSONResponse(_crisis_response(timer))
+            except UploadTooLarge as e:
+                return JSONResponse({"error": str(e)}, status_code=413)
+            except ValueError as e:
+                return JSONResponse({"error": str(e)}, status_code=400)
+            finally:
+                await run_io(upload.cleanup)
+
+            video = results["video"]
+            emotions = video["emotions_per_frame"]
+            no_face = emotions.count(NO_FACE)
+            metrics.count_frames("video", processed=len(emotions) - no_face, skipped=no_face)
+            frame_count = video["total_frames"]
+            final_emotion = video["final_emotion"]
+            analysis = results["tone"][0]
+            transcript = results["transcript"]
+            context_text = results["retrieval"]
+            questionnaire = results["questionnaire"]
+
+            prompt = _speech_prompt(context_text, transcript, analysis, questionnaire, final_emotion)
+            started = time.perf_counter()
+            answer = await generator.generate(prompt)
+            timer.record("llm", started)
+            return JSONResponse({
+                "emotions_per_frame": emotions,
+                "total_frames": frame_count,
+                "sampled_frames": video["sampled_frames"],
+                "final_emotion": final_emotion,
+                "final_response": answer,
+                "timings": timer.finish(),
+            })
+
         except Exception as e:
-            transcript = ""
-            context_text = "No relevant content found in the document."
-            questionnaire = ""
+            return JSONResponse({"error": str(e)}, status_code=400)
 
+@app.get("/process_speech")
+async def process_speech(userid):
+    """
+    Process all audio frames in S3 under a prefix matching the user ID.
+    """
+    async with limits["process_speech"].slot():
+        try:
+            timer = StageTimer()
+            try:
+                results = await run_stages(_speech_stages(userid), timer)
+            except CrisisDetected:
+                return _crisis_response(timer, user_id=userid)
+            analysis, download_ms, file_count, total_bytes, fetch_timings = results["tone"]
+            transcript = results["transcript"]
+            context_text = results["retrieval"]
+            questionnaire = results["questionnaire"]
+            print("Context for Gemini:", context_text)
 
-        prompt = f"""
-        Using the following DSM-5 context, answer the user's question:
 
-        {context_text}
+            prompt = _speech_prompt(context_text, transcript, analysis, questionnaire)
+            started = time.perf_counter()
+            answer = await generator.generate(prompt)
+            timer.record("llm", started)
 
-        User question: "{transcript}"
-        User tone analysis: "{analysis}"
-        User's previous questionnaire data: "{questionnaire}"
-        Respond in a concise, empathetic, and supportive way. Focus on genuinely understanding the person's feelings and providing comforting, actionable guidance. Understand the user's tone while responding. Do NOT provide medical advice or suggest contacting health professionals.
 
-        """
-        response = model.generate_content(prompt)
-        answer = (response.text or "").strip()
 
 
+            return {
+                "user_id": userid,
+                "analysis": analysis,
+                "download_ms": download_ms,
+                "decode_ms": fetch_timings["decode_ms"],
+                "fetch_wall_ms": fetch_timings["fetch_wall_ms"],
+                "file_count": file_count,
+                "total_bytes": total_bytes,
+                "final_response": answer,
+                "timings": timer.finish(),
+            }
 
+        except Exception as e:
+            return JSONResponse(
+                {"error": "No speech recognized or processing failed", "details": str(e)},
+                status_code=400
+            )
+    
 
-        return {
-            "user_id": userid,
-            "analysis": analysis,
-            "download_ms": download_ms,
-            "file_count": file_count,
-            "total_bytes": total_bytes,
-            "final_response": answer,
-        }
 
-    except Exception as e:
-        return JSONResponse(
-            {"error": "No speech recognized or processing failed", "details": str(e)},
-            status_code=400
-        )
-    
 
+@app.get("/process_speech/stream")
+async def process_speech_stream(userid):
+    """
+    /process_speech as server-sent events: tone_ready, crisis_check,
+    transcript_ready and context_ready as each stage finishes, then token...
+    and done. Crisis language ends the stream right after crisis_check.
+    """
+    async def events():
+        timer = StageTimer()
+        results = {}
+        try:
+            async for name, result in iter_stages(_speech_stages(userid), timer):
+                results[name] = result
+                if name == "tone":
+                    yield "tone_ready", {"analysis": result[0], "file_count": result[2]}
+                elif name == "transcript":
+                    yield "crisis_check", {"high_risk": False}
+                    yield "transcript_ready", {"transcript": result}
+                elif name == "retrieval":
+                    yield "context_ready", {"has_context": result != NO_CONTEXT}
+        except CrisisDetected:
+            yield "crisis_check", {"high_risk": True}
+            yield "done", _crisis_response(timer, user_id=userid)
+            return
+
+        analysis, download_ms, file_count, total_bytes, fetch_timings = results["tone"]
+        prompt = _speech_prompt(results["retrieval"], results["transcript"], analysis, results["questionnaire"])
+        async for event in _stream_answer(prompt, timer, {"user_id": userid, "analysis": analysis}):
+            yield event
+
+    return await _sse_response(limits["process_speech"], events())
 
 
 if __name__ == "__main__":
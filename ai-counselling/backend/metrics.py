@@ -0,0 +1,119 @@
+# metrics.py
+"""
+Prometheus instrumentation for the request pipelines.
+
+One histogram, counselling_stage_seconds{stage=...}, covers every stage that
+can regress on its own (see STAGES); counters track audio frames and
+analysis windows processed vs skipped. The existing in-process stats
+(S3Access.metrics, cache.all_stats, limiter and model registry stats) are
+exported as gauges at scrape time via register_stats.
+
+prometheus_client is optional: without it every helper is a no-op and
+render() reports that metrics are unavailable.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:
+    Histogram = None
+
+STAGES = (
+    "s3_list", "s3_download", "decode", "preprocess", "vad", "inference",
+    "asr", "embedding", "faiss_search", "mongo", "llm",
+)
+
+# ms-scale stages (FAISS, VAD) up to multi-second ones (ASR, LLM, inference)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+if Histogram is not None:
+    STAGE_SECONDS = Histogram("counselling_stage_seconds", "Wall time per pipeline stage", ["stage"], buckets=BUCKETS)
+    FRAMES = Counter("counselling_frames", "Audio/video frames, by source and outcome", ["source", "outcome"])
+    WINDOWS = Counter("counselling_windows", "Tone-analysis windows, by outcome", ["outcome"])
+
+
+def observe(stage: str, seconds: float):
+    if Histogram is not None:
+        STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    """Observe the block's wall time under stage (also when it raises)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def count_frames(source: str, processed: int = 0, skipped: int = 0):
+    if Histogram is None:
+        return
+    if processed:
+        FRAMES.labels(source, "processed").inc(processed)
+    if skipped:
+        FRAMES.labels(source, "skipped").inc(skipped)
+
+
+def count_windows(gate_stats: dict):
+    """Record a speech_window_mask result (windows_total / windows_skipped)."""
+    if Histogram is None:
+        return
+    skipped = gate_stats.get("windows_skipped", 0)
+    WINDOWS.labels("analyzed").inc(gate_stats.get("windows_total", 0) - skipped)
+    WINDOWS.labels("skipped").inc(skipped)
+
+
+# ----------------------- existing stats as gauges -----------------------
+
+_stats_sources = {}
+_stats_lock = threading.Lock()
+
+
+def register_stats(prefix: str, fn):
+    """
+    Export fn() -> {name: {field: number}} as gauges counselling_<prefix>_<field>{name=...}
+    on every scrape. Non-numeric fields are skipped; booleans become 0/1.
+    """
+    with _stats_lock:
+        _stats_sources[prefix] = fn
+
+
+class _StatsCollector:
+    def collect(self):
+        with _stats_lock:
+            sources = list(_stats_sources.items())
+        for prefix, fn in sources:
+            try:
+                stats = fn()
+            except Exception as e:
+                print(f"[metrics] {prefix} stats failed: {e}")
+                continue
+            families = {}
+            for name, fields in stats.items():
+                if not isinstance(fields, dict):
+                    continue
+                for field, value in fields.items():
+                    if not isinstance(value, (int, float)):
+                        continue
+                    family = families.get(field)
+                    if family is None:
+                        family = families[field] = GaugeMetricFamily(
+                            f"counselling_{prefix}_{field}", f"{prefix} stats: {field}", labels=["name"])
+                    family.add_metric([str(name)], float(value))
+            yield from families.values()
+
+
+if Histogram is not None:
+    REGISTRY.register(_StatsCollector())
+
+
+def render() -> tuple[bytes, str]:
+    """(body, content type) for the /metrics endpoint."""
+    if Histogram is None:
+        return b"# prometheus_client is not installed\n", "text/plain; charset=utf-8"
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,123 @@
+# model_registry.py
+"""
+Process-wide model registry: every heavy model is loaded once per process,
+lazily on first use (or eagerly via warmup), and shared by every caller.
+"""
+import threading
+import time
+
+
+def _rss_bytes() -> int | None:
+    """Current resident set size of this process (Linux), or None if unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        import resource
+        return pages * resource.getpagesize()
+    except Exception:
+        return None
+
+
+def _param_bytes(obj) -> int | None:
+    """Bytes held by torch parameters/buffers, for objects that expose them."""
+    if isinstance(obj, (tuple, list)):
+        sizes = [b for b in (_param_bytes(o) for o in obj) if b is not None]
+        return sum(sizes) if sizes else None
+    params = getattr(obj, "parameters", None)
+    if not callable(params):
+        return None
+    try:
+        total = sum(p.numel() * p.element_size() for p in obj.parameters())
+        total += sum(b.numel() * b.element_size() for b in obj.buffers())
+        return int(total)
+    except Exception:
+        return None
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._loaders = {}
+        self._warmups = {}
+        self._models = {}
+        self._stats = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader, warmup=None):
+        """Register a zero-arg loader (and optional warmup(model) callable) under name."""
+        with self._lock:
+            self._loaders[name] = loader
+            if warmup is not None:
+                self._warmups[name] = warmup
+            self._locks.setdefault(name, threading.Lock())
+
+    def names(self) -> list[str]:
+        return list(self._loaders)
+
+    def is_registered(self, name: str) -> bool:
+        return name in self._loaders
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def get(self, name: str):
+        """Return the shared instance, loading it on first call."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"No model registered under {name!r}")
+
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            rss_before = _rss_bytes()
+            t0 = time.time()
+            model = self._loaders[name]()
+            load_s = time.time() - t0
+            rss_after = _rss_bytes()
+
+            warm_s = 0.0
+            warmup = self._warmups.get(name)
+            if warmup is not None:
+                t1 = time.time()
+                try:
+                    warmup(model)
+                except Exception as e:
+                    print(f"[models] warmup for {name} failed: {e}")
+                warm_s = time.time() - t1
+
+            rss_delta = None
+            if rss_before is not None and rss_after is not None:
+                rss_delta = max(0, rss_after - rss_before)
+
+            self._stats[name] = {
+                "load_s": round(load_s, 3),
+                "warmup_s": round(warm_s, 3),
+                "param_bytes": _param_bytes(model),
+                "rss_delta_bytes": rss_delta,
+            }
+            self._models[name] = model
+            print(f"[models] loaded {name} in {load_s:.2f}s")
+            return model
+
+    def warmup(self, names=None):
+        """Eagerly load (and warm up) the given models, or all registered ones."""
+        for name in list(self._loaders) if names is None else names:
+            self.get(name)
+
+    def stats(self) -> dict:
+        """Per-model load time and memory footprint; unloaded models are listed as such."""
+        out = {}
+        for name in self._loaders:
+            if name in self._stats:
+                out[name] = {"loaded": True, **self._stats[name]}
+            else:
+                out[name] = {"loaded": False}
+        return out
+
+
+registry = ModelRegistry()
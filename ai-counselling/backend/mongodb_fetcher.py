@@ -1,31 +1,221 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING
 import os
+import sqlite3
+import threading
+import time
 from dotenv import load_dotenv
+from cache import TTLCache
+import metrics
+
+load_dotenv()
 
 mongo_uri = os.getenv("MONGODB_URI")
-mongo_uri  = os.getenv("MONGO_DB")
+mongo_db  = os.getenv("MONGO_DB", "coach")  # same default as src/lib/mongo.ts
 collection_name = os.getenv("MONGO_COLLECTION")
 
-client = MongoClient(mongo_uri)
-db = client[mongo_uri]
-
 # ----------------- MongoDB connection -----------------
+# One pool per process; sized for IO_THREADS concurrent blocking calls plus the async client
+POOL_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "2")),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_MS", "60000")),
+    "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    "retryReads": True,
+}
 
+client = MongoClient(mongo_uri, **POOL_OPTIONS)
+db = client[mongo_db]
 
 
-def fetch_all_from_mongo(collection_name: str, query: dict = None, limit: int = 0):
+def fetch_all_from_mongo(collection_name: str, query: dict = None, limit: int = 0, projection: dict = None):
     """
-    Fetch all documents (all fields) from a MongoDB collection and return as list of dicts.
+    Fetch documents from a MongoDB collection and return as list of dicts
+    (all fields unless a projection is given).
     """
     query = query or {}
     collection = db[collection_name]
-    cursor = collection.find(query) 
+    cursor = collection.find(query, projection=projection)
     if limit > 0:
         cursor = cursor.limit(limit)
-    results = list(cursor)
+    with metrics.timed("mongo"):
+        results = list(cursor)
     
     
     for doc in results:
         if "_id" in doc:
             doc["_id"] = str(doc["_id"])
     return results
+
+
+# ----------------- audio frame metadata -----------------
+# The upload route (src/app/api/audio/route.ts) writes one audio_frames doc per
+# S3 object, so "latest frames for a user" is an indexed query instead of a
+# bucket listing.
+
+_audio_index_ready = False
+_audio_index_lock = threading.Lock()
+
+
+def ensure_audio_frame_index():
+    """Create the (clerk_user_id, ts_ms desc) index once per process (no-op if it exists)."""
+    global _audio_index_ready
+    if _audio_index_ready:
+        return
+    with _audio_index_lock:
+        if not _audio_index_ready:
+            db["audio_frames"].create_index(
+                [("clerk_user_id", ASCENDING), ("ts_ms", DESCENDING)],
+                name="clerk_user_id_1_ts_ms_-1",
+            )
+            _audio_index_ready = True
+
+
+def fetch_latest_audio_frames(user_id: str, limit: int = 30, min_bytes: int = 0):
+    """
+    Newest audio frames for one user, newest first, as dicts with s3Key, bytes and ts_ms.
+    Served by the (clerk_user_id, ts_ms desc) index; cost is independent of other users.
+    """
+    ensure_audio_frame_index()
+    query = {"clerk_user_id": user_id, "s3Key": {"$exists": True}}
+    if min_bytes > 0:
+        query["bytes"] = {"$gte": min_bytes}
+    cursor = (
+        db["audio_frames"]
+        .find(query, projection={"_id": 0, "s3Key": 1, "bytes": 1, "ts_ms": 1})
+        .sort("ts_ms", DESCENDING)
+        .limit(limit)
+    )
+    with metrics.timed("mongo"):
+        return list(cursor)
+
+
+# ----------------- user profile (questionnaire) -----------------
+# src/db/users.ts keys users by clerk_user_id; only the onboarding answers go
+# into prompts, so contact details and timestamps are never fetched.
+# The same profile is read on every message of a session, hence the cache;
+# writers (saveOnboarding, preference updates) call invalidate_user.
+#
+# With CACHE_DB set, an invalidation also writes a per-user stamp to the shared
+# SQLite tier, and every worker checks its cached copy against that stamp, so
+# an invalidation sent to one uvicorn worker reaches all of them on the host.
+# Without CACHE_DB each worker only drops its own copy; the others serve theirs
+# until CACHE_USER_PROFILE_TTL_S (default 300 s) expires it.
+
+PROFILE_PROJECTION = {"_id": 0, "onboarding": 1, "onboarded": 1}
+
+profiles = TTLCache.from_env("user_profile", maxsize=4096, ttl_s=300)
+
+_users_index_ready = False
+_users_index_lock = threading.Lock()
+
+
+def ensure_users_index():
+    global _users_index_ready
+    if _users_index_ready:
+        return
+    with _users_index_lock:
+        if not _users_index_ready:
+            db["users"].create_index([("clerk_user_id", ASCENDING)], name="clerk_user_id_1")
+            _users_index_ready = True
+
+
+# Bumped by every invalidation. A fetch only caches its result if no
+# invalidation ran while it was reading, so a write that lands mid-fetch is
+# never hidden behind the pre-write doc for the rest of the TTL.
+_profile_generation = 0
+_profile_generation_lock = threading.Lock()
+
+
+def _stamp_key(user_id: str) -> str:
+    return f"user_profile_stamp:{user_id}"
+
+
+def _shared_stamp(user_id: str):
+    """The user's invalidation stamp in the shared tier (None without one)."""
+    if profiles.disk is None:
+        return None
+    try:
+        stamp = profiles.disk.get(_stamp_key(user_id))
+    except sqlite3.Error:
+        return None
+    return stamp if isinstance(stamp, int) else None
+
+
+def _store_profile(user_id: str, doc: dict, generation: int, stamp):
+    if stamp != _shared_stamp(user_id):
+        return  # invalidated by another worker while reading
+    with _profile_generation_lock:
+        if generation == _profile_generation:
+            profiles.set(user_id, (stamp, doc))
+
+
+def _cached_profile(user_id: str):
+    cached = profiles.get(user_id)
+    if cached is None or cached[0] != _shared_stamp(user_id):
+        return None
+    return cached[1]
+
+
+def fetch_user_profile(user_id: str) -> dict:
+    """Projected questionnaire data for one user ({} if none), cached per user."""
+    cached = _cached_profile(user_id)
+    if cached is not None:
+        return cached
+    generation, stamp = _profile_generation, _shared_stamp(user_id)
+    ensure_users_index()
+    with metrics.timed("mongo"):
+        doc = db["users"].find_one({"clerk_user_id": user_id}, projection=PROFILE_PROJECTION) or {}
+    _store_profile(user_id, doc, generation, stamp)
+    return doc
+
+
+def invalidate_user(user_id: str):
+    """Drop a cached profile after the user's onboarding/preferences change (in every worker with CACHE_DB)."""
+    global _profile_generation
+    if profiles.disk is not None:
+        try:
+            # outlives every copy cached before it, so no worker can still hold one once it expires
+            profiles.disk.set(_stamp_key(user_id), time.time_ns(), profiles.ttl_s)
+        except sqlite3.Error as e:
+            print(f"[mongodb_fetcher] shared invalidation failed: {e}")
+    with _profile_generation_lock:
+        _profile_generation += 1
+        profiles.invalidate(user_id)
+
+
+_async_db = None
+_async_lock = threading.Lock()
+
+
+def _motor_db():
+    """Motor database on the same URI and pool settings (None when motor is not installed)."""
+    global _async_db
+    with _async_lock:
+        if _async_db is None:
+            try:
+                from motor.motor_asyncio import AsyncIOMotorClient
+            except ImportError:
+                return None
+            _async_db = AsyncIOMotorClient(mongo_uri, **POOL_OPTIONS)[mongo_db]
+        return _async_db
+
+
+async def fetch_user_profile_async(user_id: str) -> dict:
+    """fetch_user_profile without blocking the event loop (same cache)."""
+    cached = _cached_profile(user_id)
+    if cached is not None:
+        return cached
+    generation, stamp = _profile_generation, _shared_stamp(user_id)
+    adb = _motor_db()
+    if adb is None:
+        from execution import run_io
+
+        return await run_io(fetch_user_profile, user_id)
+    if not _users_index_ready:
+        from execution import run_io
+
+        await run_io(ensure_users_index)
+    with metrics.timed("mongo"):
+        doc = await adb["users"].find_one({"clerk_user_id": user_id}, projection=PROFILE_PROJECTION) or {}
+    _store_profile(user_id, doc, generation, stamp)
+    return doc
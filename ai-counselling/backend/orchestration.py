@@ -0,0 +1,110 @@
+# orchestration.py
+"""
+Request-level stage graph: every stage starts as soon as its dependencies
+finish, so independent slow stages (tone analysis, transcription, Mongo,
+video frames) overlap instead of adding up.
+"""
+import asyncio
+import time
+
+_REQUIRED = object()
+
+
+class StopPipeline(Exception):
+    """
+    Raised by a stage to end the whole graph early (e.g. crisis language in
+    the transcript): the other stages' tasks are cancelled and run_stages
+    re-raises it even if the raising stage has a fallback. Cancelling a task
+    does not stop work already handed to a thread or process pool; stages
+    that need that pass their own cancel flag (see main2's tone stage).
+    """
+
+
+class Stage:
+    """
+    A named async step. fn receives a dict of its dependencies' results.
+    If fallback is given, a failure yields the fallback value instead of
+    failing the whole graph.
+    """
+
+    def __init__(self, name: str, fn, deps=(), fallback=_REQUIRED):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.fallback = fallback
+
+
+class StageTimer:
+    """Collects per-stage wall time in ms (also usable for steps outside the graph)."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.timings = {}
+
+    def record(self, name: str, started: float):
+        self.timings[name] = int((time.perf_counter() - started) * 1000)
+
+    def finish(self) -> dict:
+        self.timings["total"] = int((time.perf_counter() - self.t0) * 1000)
+        return self.timings
+
+
+async def run_stages(stages: list[Stage], timer: StageTimer | None = None, on_stage=None) -> dict:
+    """
+    Run the graph and return {stage name: result}.
+    A stage without a fallback that fails cancels the rest and re-raises.
+    on_stage(name, result), if given, is called as each stage finishes.
+    """
+    timer = timer or StageTimer()
+    by_name = {s.name: s for s in stages}
+    for s in stages:
+        missing = [d for d in s.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"stage {s.name!r} depends on unknown stages {missing}")
+
+    tasks = {}
+
+    async def run(stage: Stage):
+        inputs = {d: await tasks[d] for d in stage.deps}
+        started = time.perf_counter()
+        try:
+            result = await stage.fn(inputs)
+        except Exception as e:
+            if stage.fallback is _REQUIRED or isinstance(e, StopPipeline):
+                raise
+            print(f"[stage {stage.name}] failed, using fallback: {e}")
+            result = stage.fallback
+        finally:
+            timer.record(stage.name, started)
+        if on_stage is not None:
+            on_stage(stage.name, result)
+        return result
+
+    for s in stages:
+        tasks[s.name] = asyncio.ensure_future(run(s))
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for t in tasks.values():
+            t.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    return {name: t.result() for name, t in tasks.items()}
+
+
+async def iter_stages(stages: list[Stage], timer: StageTimer | None = None):
+    """
+    Run the graph like run_stages, yielding (name, result) in completion order
+    (for streaming progress to a client). Required-stage failures re-raise.
+    """
+    done = asyncio.Queue()
+    graph = asyncio.ensure_future(run_stages(stages, timer, on_stage=lambda n, r: done.put_nowait((n, r))))
+    graph.add_done_callback(lambda _: done.put_nowait(None))
+    try:
+        while (item := await done.get()) is not None:
+            yield item
+        graph.result()
+    finally:
+        if not graph.done():
+            graph.cancel()
+            await asyncio.gather(graph, return_exceptions=True)
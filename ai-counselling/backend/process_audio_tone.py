@@ -4,24 +4,108 @@ import librosa
 import math
 import numpy as np
 import os
-import io
-import tempfile
+import re
 import time
-import boto3
-from collections import Counter
+import threading
+from collections import OrderedDict
 import warnings
+import metrics
+from model_registry import registry
+from vad import speech_window_mask
+from s3_audio_pipeline import fetch_and_decode
+from audio_decode import decode_to_float32
+from s3_access import as_s3_access
+from audio_preprocess import normalize
 
 warnings.filterwarnings('ignore')
 
 
 
 
+CHUNK_DUR = 1.0
+OVERLAP_DUR = 0.5
+
+
+def _frame_windows(y: np.ndarray, sr: int, chunk_dur=CHUNK_DUR, overlap_dur=OVERLAP_DUR):
+    """
+    Cut y into overlapping fixed-size windows (last one zero-padded).
+    Returns (windows [n, chunk_size] float32, starts, ends) with starts/ends in samples.
+    """
+    chunk_size, overlap_size = int(chunk_dur * sr), int(overlap_dur * sr)
+    step = chunk_size - overlap_size
+
+    if len(y) < chunk_size // 3:
+        return np.zeros((0, chunk_size), dtype=np.float32), [], []
+
+    windows, starts, ends = [], [], []
+    num_chunks = max(0, math.ceil((len(y) - chunk_size) / step) + 1)
+    for i in range(num_chunks):
+        start = i * step
+        end = min(start + chunk_size, len(y))
+        if end - start < chunk_size // 3:
+            break
+        chunk = y[start:end]
+        if len(chunk) < chunk_size:
+            chunk = np.pad(chunk, (0, chunk_size - len(chunk)), mode='constant')
+        windows.append(chunk)
+        starts.append(start)
+        ends.append(end)
+
+    if not windows:
+        return np.zeros((0, chunk_size), dtype=np.float32), [], []
+    return np.stack(windows).astype(np.float32, copy=False), starts, ends
+
+
+DEFAULT_EMOTION_MODEL = "r-f/wav2vec-english-speech-emotion-recognition"
+
+
+def _emotion_registry_name(model_name: str) -> str:
+    if model_name == DEFAULT_EMOTION_MODEL:
+        return "wav2vec2_emotion"
+    return f"wav2vec2_emotion:{model_name}"
+
+
+def _load_emotion_backbone(model_name: str):
+    feature_extractor = Wav2Vec2FeatureExtractor.from_pretrained(model_name)
+    model = Wav2Vec2ForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+    return feature_extractor, model
+
+
+def _warmup_emotion_backbone(backbone):
+    feature_extractor, model = backbone
+    inputs = feature_extractor([np.zeros(16000, dtype=np.float32)], sampling_rate=16000,
+                               return_tensors="pt", padding=True)
+    with torch.no_grad():
+        model(**inputs)
+
+
+def get_emotion_backbone(model_name: str = DEFAULT_EMOTION_MODEL):
+    """Shared (feature_extractor, model) pair for model_name, loaded once per process."""
+    name = _emotion_registry_name(model_name)
+    if not registry.is_registered(name):
+        registry.register(name, lambda: _load_emotion_backbone(model_name), warmup=_warmup_emotion_backbone)
+    return registry.get(name)
+
+
+registry.register(
+    _emotion_registry_name(DEFAULT_EMOTION_MODEL),
+    lambda: _load_emotion_backbone(DEFAULT_EMOTION_MODEL),
+    warmup=_warmup_emotion_backbone,
+)
+
+
 class EnsembleEmotionRecognizer:
-    def __init__(self, model_name="r-f/wav2vec-english-speech-emotion-recognition", num_runs=5):
-        self.feature_extractor = Wav2Vec2FeatureExtractor.from_pretrained(model_name)
-        self.model = Wav2Vec2ForSequenceClassification.from_pretrained(model_name)
-        self.model.eval()
+    def __init__(self, model_name=DEFAULT_EMOTION_MODEL, num_runs=5,
+                 batch_size=16, augment=False):
+        # Weights come from the process-wide registry, so recognizers are cheap to create
+        self.feature_extractor, self.model = get_emotion_backbone(model_name)
+        # The model is deterministic in eval(), so repeated identical passes add nothing.
+        # num_runs > 1 only matters with augment=True: each extra run is a test-time
+        # augmented view that rides in the same forward batch as the original window.
         self.num_runs = num_runs
+        self.batch_size = batch_size
+        self.augment = augment
 
         # Confidence thresholds (unused in logic, kept for clarity)
         self.high_confidence_threshold = 0.7
@@ -52,80 +136,121 @@ class EnsembleEmotionRecognizer:
 
         return True
 
-    def predict_single_chunk(self, audio_chunk: np.ndarray, sr: int):
-        """Return (emotion, confidence) for a single chunk, or (None, 0.0) if invalid."""
-        if not self.is_valid_speech(audio_chunk, sr):
-            return None, 0.0
+    def _views(self, windows: np.ndarray) -> np.ndarray:
+        """
+        Stack test-time augmented views of each window: [n, views, chunk_size].
+        View 0 is always the untouched window; extra views apply a small gain change
+        and a circular time shift so they are actually different inputs.
+        """
+        n_views = self.num_runs if self.augment else 1
+        views = [windows]
+        for v in range(1, max(1, n_views)):
+            gain = 1.0 + (0.1 if v % 2 else -0.1) * ((v + 1) // 2)
+            shift = int(0.02 * windows.shape[1]) * ((v + 1) // 2) * (1 if v % 2 else -1)
+            views.append(np.roll(windows, shift, axis=1) * gain)
+        return np.stack(views, axis=1).astype(np.float32, copy=False)
+
+    def predict_proba(self, windows: np.ndarray, sr: int) -> np.ndarray:
+        """
+        Softmax distributions for a stack of equal-length windows [n, samples].
+        Runs one no_grad forward per batch of self.batch_size windows (augmented
+        views included in the batch) and returns [n, num_labels]; rows for batches
+        that failed are NaN.
+        """
+        num_labels = len(self.model.config.id2label)
+        if len(windows) == 0:
+            return np.zeros((0, num_labels), dtype=np.float32)
+
+        views = self._views(np.asarray(windows, dtype=np.float32))
+        n, n_views = views.shape[0], views.shape[1]
+        flat = views.reshape(n * n_views, -1)
+        per_batch = max(1, self.batch_size) * n_views
+
+        probs = np.full((n * n_views, num_labels), np.nan, dtype=np.float32)
+        for b in range(0, len(flat), per_batch):
+            batch = flat[b:b + per_batch]
+            try:
+                inputs = self.feature_extractor(list(batch), sampling_rate=sr, return_tensors="pt", padding=True)
+                with torch.no_grad():
+                    logits = self.model(**inputs).logits
+                probs[b:b + len(batch)] = torch.softmax(logits, dim=-1).cpu().numpy()
+            except Exception:
+                continue
 
-        try:
-            inputs = self.feature_extractor(audio_chunk, sampling_rate=sr, return_tensors="pt", padding=True)
-            with torch.no_grad():
-                logits = self.model(**inputs).logits
-            probs = torch.softmax(logits.squeeze(0), dim=-1)
-            top_prob, predicted_id = torch.max(probs, dim=-1)
-            emotion = self.model.config.id2label[predicted_id.item()]
-            return emotion, float(top_prob.item())
-        except Exception:
-            return None, 0.0
+        # Average the views of each window back into one distribution
+        return probs.reshape(n, n_views, num_labels).mean(axis=1)
 
-    def predict_chunk_ensemble(self, audio_chunk: np.ndarray, sr: int):
-        """Run multiple predictions and return majority-vote emotion + ensemble confidence."""
-        predictions, confidences = [], []
-        for _ in range(self.num_runs):
-            emotion, conf = self.predict_single_chunk(audio_chunk, sr)
-            if emotion is not None:
-                predictions.append(emotion)
-                confidences.append(conf)
-        if not predictions:
-            return None, 0.0
-
-        counts = Counter(predictions)
-        final_emotion, vote_count = counts.most_common(1)[0]
-        vote_ratio = vote_count / len(predictions)
-        emo_conf = [c for e, c in zip(predictions, confidences) if e == final_emotion]
-        ensemble_confidence = float(vote_ratio * (np.mean(emo_conf) if emo_conf else 0.0))
-        return final_emotion, ensemble_confidence
+    def predict_windows(self, windows: np.ndarray, sr: int, mask: np.ndarray | None = None):
+        """
+        Run the windows allowed by mask (default: per-window is_valid_speech) through
+        predict_proba and return a list of (emotion, confidence) per window
+        ((None, 0.0) if skipped).
+        """
+        out = [(None, 0.0)] * len(windows)
+        if mask is None:
+            valid = [i for i, w in enumerate(windows) if self.is_valid_speech(w, sr)]
+        else:
+            valid = list(np.flatnonzero(mask))
+        if not valid:
+            return out
 
-    def process_audio(self, audio_file: str):
-        """Process a single audio file path (any format librosa can decode)."""
-        sr_target = 16000
-        print(f"Running ensemble emotion recognition ({self.num_runs} runs per chunk)...")
-        y, sr = librosa.load(audio_file, sr=sr_target, mono=True)
-        y = librosa.util.normalize(y)
-        y, _ = librosa.effects.trim(y, top_db=20)
+        probs = self.predict_proba(windows[valid], sr)
+        for i, p in zip(valid, probs):
+            if np.isnan(p).any():
+                continue
+            predicted_id = int(np.argmax(p))
+            out[i] = (self.model.config.id2label[predicted_id], float(p[predicted_id]))
+        return out
 
-        total_duration = len(y) / sr_target
-        print(f"Processing audio: {total_duration:.2f} seconds")
+    def predict_single_chunk(self, audio_chunk: np.ndarray, sr: int):
+        """Return (emotion, confidence) for a single chunk, or (None, 0.0) if invalid."""
+        return self.predict_windows(np.asarray(audio_chunk, dtype=np.float32)[None, :], sr)[0]
 
-        # Chunking
-        chunk_dur = 1.0
-        overlap_dur = 0.5
-        chunk_size = int(chunk_dur * sr_target)
-        overlap_size = int(overlap_dur * sr_target)
-        step = chunk_size - overlap_size
+    def predict_chunk_ensemble(self, audio_chunk: np.ndarray, sr: int):
+        """Ensemble prediction for one chunk; augmented views (if any) share one forward pass."""
+        return self.predict_single_chunk(audio_chunk, sr)
 
+    def analyze_waveform(self, y: np.ndarray, sr: int, total_duration: float | None = None):
+        """
+        Window an already-loaded waveform and return (results, gate_stats).
+        Silent/noisy windows are dropped by the framewise VAD before inference.
+        """
+        windows, starts, ends = _frame_windows(y, sr)
+        with metrics.timed("vad"):
+            mask, gate_stats = speech_window_mask(y, sr, starts, windows.shape[1])
+        metrics.count_windows(gate_stats)
+        if total_duration is None:
+            total_duration = len(y) / sr
+
+        with metrics.timed("inference"):
+            predictions = self.predict_windows(windows, sr, mask)
         results = []
-        if len(y) < chunk_size // 3:
-            return results
-
-        num_chunks = max(0, math.ceil((len(y) - chunk_size) / step) + 1)
-        for i in range(num_chunks):
-            start = i * step
-            end = min(start + chunk_size, len(y))
-            if end - start < chunk_size // 3:
-                break
-            chunk = y[start:end]
-            if len(chunk) < chunk_size:
-                chunk = np.pad(chunk, (0, chunk_size - len(chunk)), mode='constant')
-            emotion, conf = self.predict_chunk_ensemble(chunk, sr_target)
+        for (emotion, conf), start, end in zip(predictions, starts, ends):
             if emotion is None:
                 continue
             results.append({
                 "emotion": emotion,
                 "confidence": float(conf),
-                "start": start / sr_target,
-                "end": min(end / sr_target, total_duration),
+                "start": start / sr,
+                "end": min(end / sr, total_duration),
             })
+        return results, gate_stats
+
+    def process_audio(self, audio_file: str):
+        """Process a single audio file path (any format librosa can decode)."""
+        sr_target = 16000
+        print(f"Running batched emotion recognition (batch size {self.batch_size})...")
+        with metrics.timed("decode"):
+            y, sr = librosa.load(audio_file, sr=sr_target, mono=True)
+        with metrics.timed("preprocess"):
+            y = normalize(y, headroom_db=0.0)
+            y, _ = librosa.effects.trim(y, top_db=20)
+
+        total_duration = len(y) / sr_target
+        print(f"Processing audio: {total_duration:.2f} seconds")
+
+        results, gate_stats = self.analyze_waveform(y, sr_target, total_duration)
+        print(f"Skipped {gate_stats['windows_skipped']}/{gate_stats['windows_total']} windows (silence/noise)")
 
         print("Ensemble processing complete!")
         return results
@@ -133,82 +258,115 @@ class EnsembleEmotionRecognizer:
 
 
 
+class _ToneAggregate:
+    """
+    Running phase/distribution aggregate over time-ordered window results.
+    extend() can be called repeatedly; to_dict() matches _summarize_results_to_dict
+    over all results seen so far.
+    """
+
+    def __init__(self):
+        self.phases = []
+        self.distribution = {}
+        self.conf_sum = 0.0
+        self.conf_count = 0
+        self.start = None
+        self.end = None
+
+    def extend(self, results: list[dict]):
+        for r in results:
+            if self.start is None:
+                self.start = r["start"]
+            self.end = r["end"]
+            self.conf_sum += r["confidence"]
+            self.conf_count += 1
+
+            current = self.phases[-1] if self.phases else None
+            if current is None or current["emotion"] != r["emotion"]:
+                self.phases.append({
+                    "emotion": r["emotion"],
+                    "start": r["start"],
+                    "end": r["end"],
+                    "confidences": [r["confidence"]],
+                })
+                self.distribution[r["emotion"]] = self.distribution.get(r["emotion"], 0.0) + (r["end"] - r["start"])
+            else:
+                # Merge consecutive identical emotions into phases
+                self.distribution[r["emotion"]] += r["end"] - current["end"]
+                current["end"] = r["end"]
+                current["confidences"].append(r["confidence"])
+        return self
+
+    def to_dict(self) -> dict | None:
+        if not self.conf_count:
+            return None
+        return {
+            # only the last phase can still grow; earlier ones are shared, not copied
+            "phases": self.phases[:-1] + [dict(self.phases[-1], confidences=list(self.phases[-1]["confidences"]))],
+            "distribution": dict(self.distribution),
+            "total_duration": float(self.end - self.start),
+            "avg_confidence": float(self.conf_sum / self.conf_count),
+        }
+
+
 def _summarize_results_to_dict(results: list[dict]) -> dict | None:
-    if not results:
-        return None
+    return _ToneAggregate().extend(results).to_dict()
 
-    # Merge consecutive identical emotions into phases
-    phases, current = [], None
-    for r in results:
-        if current is None or current["emotion"] != r["emotion"]:
-            if current is not None:
-                phases.append(current)
-            current = {
-                "emotion": r["emotion"],
-                "start": r["start"],
-                "end": r["end"],
-                "confidences": [r["confidence"]],
-            }
-        else:
-            current["end"] = r["end"]
-            current["confidences"].append(r["confidence"])
-    if current is not None:
-        phases.append(current)
-
-    total_duration = results[-1]["end"] - results[0]["start"]
-    durations = {}
-    for p in phases:
-        durations[p["emotion"]] = durations.get(p["emotion"], 0.0) + (p["end"] - p["start"])
-    all_conf = [r["confidence"] for r in results]
-
-    return {
-        "phases": phases,
-        "distribution": durations,
-        "total_duration": float(total_duration),
-        "avg_confidence": float(np.mean(all_conf)) if all_conf else 0.0,
-    }
-
-
-def analyze_audio_array(waveform: np.ndarray, rate: int, num_runs=5) -> dict | None:
-    rec = EnsembleEmotionRecognizer(num_runs=num_runs)
-    y = librosa.util.normalize(waveform.astype(np.float32, copy=False))
-    y, _ = librosa.effects.trim(y, top_db=20)
-
-    sr_target = rate
-    chunk_dur, overlap_dur = 1.0, 0.5
-    chunk_size, overlap_size = int(chunk_dur * sr_target), int(overlap_dur * sr_target)
-    step = chunk_size - overlap_size
 
-    if len(y) < chunk_size // 3:
-        return None
+def _empty_analysis() -> dict:
+    return {"phases": [], "distribution": {}, "total_duration": 0.0, "avg_confidence": 0.0,
+            "windows_total": 0, "windows_skipped": 0}
 
-    results = []
-    num_chunks = max(0, math.ceil((len(y) - chunk_size) / step) + 1)
-    for i in range(num_chunks):
-        start = i * step
-        end = min(start + chunk_size, len(y))
-        if end - start < chunk_size // 3:
-            break
-        chunk = y[start:end]
-        if len(chunk) < chunk_size:
-            chunk = np.pad(chunk, (0, chunk_size - len(chunk)), mode='constant')
 
-        emotion, conf = rec.predict_chunk_ensemble(chunk, sr_target)
-        if emotion is None:
-            continue
-        results.append({"emotion": emotion, "confidence": float(conf), "start": start / sr_target, "end": end / sr_target})
+def _empty_timings() -> dict:
+    return {"download_ms": 0, "decode_ms": 0, "fetch_wall_ms": 0}
 
-    return _summarize_results_to_dict(results)
 
+def analyze_audio_array(waveform: np.ndarray, rate: int, num_runs=5, recognizer=None) -> dict | None:
+    rec = recognizer or EnsembleEmotionRecognizer(num_runs=num_runs)
+    with metrics.timed("preprocess"):
+        y = normalize(waveform.astype(np.float32, copy=False), headroom_db=0.0)
+        y, _ = librosa.effects.trim(y, top_db=20)
+
+    if len(y) < int(CHUNK_DUR * rate) // 3:
+        return None
 
-def analyze_audio_ensemble(audio_file: str, num_runs=5) -> dict | None:
-    rec = EnsembleEmotionRecognizer(num_runs=num_runs)
+    # analyze_audio_array never clamped window ends to the trimmed duration
+    results, gate_stats = rec.analyze_waveform(y, rate, total_duration=float("inf"))
+    summary = _summarize_results_to_dict(results)
+    if summary is not None:
+        summary["windows_total"] = gate_stats["windows_total"]
+        summary["windows_skipped"] = gate_stats["windows_skipped"]
+    return summary
+
+
+def analyze_audio_ensemble(audio_file: str, num_runs=5, recognizer=None) -> dict | None:
+    rec = recognizer or EnsembleEmotionRecognizer(num_runs=num_runs)
     results = rec.process_audio(audio_file)
     return _summarize_results_to_dict(results)
 
 
 # ------------------------------ S3 wrappers ------------------------------
 
+ALLOWED_AUDIO_EXTS = {".wav", ".mp3", ".flac", ".m4a", ".webm"}
+
+_DIGITS = re.compile(r"(\d+)")
+
+
+class AnalysisCancelled(Exception):
+    """process_s3_frames stopped because its cancel event was set."""
+
+
+def _check_cancel(cancel):
+    if cancel is not None and cancel.is_set():
+        raise AnalysisCancelled()
+
+
+def _natural_key(key: str):
+    """Sort key comparing digit runs as numbers: frame_9_... before frame_10_..."""
+    return [int(part) if part.isdigit() else part for part in _DIGITS.split(key)]
+
+
 class SpeechProcessor:
     _instance = None  # optional simple cache
 
@@ -217,87 +375,200 @@ class SpeechProcessor:
         self.recognizer = EnsembleEmotionRecognizer(
             num_runs=options.get("num_runs", 3)
         )
+        # incremental per-prefix state, LRU-bounded
+        self.max_sessions = int(options.get("max_sessions", os.getenv("TONE_MAX_SESSIONS", "256")))
+        self.session_idle_s = float(options.get("session_idle_s", os.getenv("TONE_SESSION_IDLE_S", "1800")))
+        self._sessions = OrderedDict()
+        self._sessions_lock = threading.Lock()
 
     def process_file(self, path: str):
-        return analyze_audio_ensemble(path, num_runs=self.recognizer.num_runs)
+        return analyze_audio_ensemble(path, recognizer=self.recognizer)
 
     def process_s3(self, bucket: str, key: str, s3_client=None):
         """
-        Download a single S3 object to a temp file (preserving suffix),
+        Download a single S3 object into memory, decode it through an ffmpeg pipe,
         analyze, and return (analysis_dict, download_ms).
         """
-        s3 = s3_client or boto3.client("s3")
+        s3 = as_s3_access(s3_client)
         suffix = (os.path.splitext(key)[1] or ".wav").lower()
         t0 = time.time()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            s3.download_fileobj(bucket, key, tmp)
-            tmp_path = tmp.name
+        data = s3.get_bytes(bucket, key)
         download_ms = int((time.time() - t0) * 1000)
 
-        try:
-            analysis = analyze_audio_ensemble(tmp_path, num_runs=self.recognizer.num_runs)
-            if analysis is None:
-                analysis = {"phases": [], "distribution": {}, "total_duration": 0.0, "avg_confidence": 0.0}
-            return analysis, download_ms
-        finally:
-            try:
-                os.remove(tmp_path)
-            except OSError:
-                pass
+        y = decode_to_float32(data, sr=16000, suffix=suffix)
+        analysis = analyze_audio_array(y, rate=16000, recognizer=self.recognizer)
+        if analysis is None:
+            analysis = _empty_analysis()
+        return analysis, download_ms
+
+    def _list_audio_keys(self, s3, bucket: str, prefix: str):
+        """Audio keys under prefix in upload order (see _natural_key) and their sizes."""
+        objects = []
+        for obj in s3.iter_objects(bucket, prefix):
+            key = obj["Key"]
+            if key.endswith("/"):
+                continue
+            if not any(key.lower().endswith(ext) for ext in ALLOWED_AUDIO_EXTS):
+                continue
+            objects.append((key, int(obj.get("Size", 0))))
+        objects.sort(key=lambda o: _natural_key(o[0]))
+        return [k for k, _ in objects], [size for _, size in objects]
 
-    def process_s3_frames(self, bucket: str, prefix: str, s3_client=None):
+    def process_s3_frames(self, bucket: str, prefix: str, s3_client=None, incremental=False, cancel=None):
         """
-        List all audio objects under s3://bucket/prefix, download each to a temp file,
-        decode with librosa (FFmpeg-backed; supports .webm), resample to 16k mono,
-        concatenate, and analyze once.
-        Returns (analysis_dict, download_ms, file_count, total_bytes)
+        List all audio objects under s3://bucket/prefix, fetch and decode them
+        concurrently in memory (s3_audio_pipeline; ffmpeg pipe, supports .webm),
+        resample to 16k mono, concatenate in upload order, and analyze once.
+        With incremental=True only frames added since the previous call for this
+        prefix are fetched and analyzed (see _process_s3_frames_incremental).
+        Returns (analysis_dict, download_ms, file_count, total_bytes, timings), where
+        timings holds download_ms, decode_ms and fetch_wall_ms.
+        cancel (a threading.Event) is checked between fetch and inference; once
+        set, AnalysisCancelled is raised and no session state is committed.
         """
-        s3 = s3_client or boto3.client("s3")
-        paginator = s3.get_paginator("list_objects_v2")
-        allowed_exts = {".wav", ".mp3", ".flac", ".m4a", ".webm"}
+        s3 = as_s3_access(s3_client)
+        if incremental:
+            return self._process_s3_frames_incremental(s3, bucket, prefix, cancel)
 
-        keys, total_bytes = [], 0
-        t0 = time.time()
-        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-            for obj in page.get("Contents", []) or []:
-                key = obj["Key"]
-                if key.endswith("/"):
-                    continue
-                if not any(key.lower().endswith(ext) for ext in allowed_exts):
-                    continue
-                keys.append(key)
-                total_bytes += int(obj.get("Size", 0))
+        keys, sizes = self._list_audio_keys(s3, bucket, prefix)
 
         if not keys:
             # empty prefix; return an empty analysis:
-            return {"phases": [], "distribution": {}, "total_duration": 0.0, "avg_confidence": 0.0}, 0, 0, 0
-
-        keys.sort()
-
-        # Download & decode each; use librosa.load for .webm (requires ffmpeg)
-        waveforms = []
-        for k in keys:
-            suffix = (os.path.splitext(k)[1] or ".wav").lower()
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmpf:
-                s3.download_fileobj(bucket, k, tmpf)
-                tmp_path = tmpf.name
-            try:
-                y, sr = librosa.load(tmp_path, sr=16000, mono=True)
-                waveforms.append(y.astype(np.float32, copy=False))
-            finally:
-                try:
-                    os.remove(tmp_path)
-                except OSError:
-                    pass
+            return _empty_analysis(), 0, 0, 0, _empty_timings()
 
+        waveforms, timings = fetch_and_decode(s3, bucket, keys, sizes, sr=16000)
+        _check_cancel(cancel)
+        metrics.count_frames("tone", processed=len(keys))
         combined = np.concatenate(waveforms) if len(waveforms) > 1 else waveforms[0]
-        download_ms = int((time.time() - t0) * 1000)
 
-        analysis = analyze_audio_array(combined, rate=16000, num_runs=self.recognizer.num_runs)
+        analysis = analyze_audio_array(combined, rate=16000, recognizer=self.recognizer)
         if analysis is None:
-            analysis = {"phases": [], "distribution": {}, "total_duration": 0.0, "avg_confidence": 0.0}
+            analysis = _empty_analysis()
 
-        return analysis, download_ms, len(keys), total_bytes
+        return analysis, timings["download_ms"], len(keys), sum(sizes), timings
+
+    # ------------------------- incremental sessions -------------------------
+
+    def _session(self, bucket: str, prefix: str) -> "_StreamSession":
+        """
+        Session for a prefix. One idle for more than session_idle_s is replaced,
+        so a returning user starts over (the next call analyzes the whole
+        prefix, as after a restart) instead of growing one aggregate forever.
+        """
+        with self._sessions_lock:
+            key = (bucket, prefix)
+            now = time.monotonic()
+            session = self._sessions.pop(key, None)
+            if session is None or now - session.last_used > self.session_idle_s:
+                session = _StreamSession()
+            session.last_used = now
+            self._sessions[key] = session  # most recently used last
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def reset_session(self, bucket: str, prefix: str):
+        """Forget incremental state for a prefix (e.g. when a new recording session starts)."""
+        with self._sessions_lock:
+            self._sessions.pop((bucket, prefix), None)
+
+    def _process_s3_frames_incremental(self, s3, bucket: str, prefix: str, cancel=None):
+        """
+        Analyze only the frames not seen by an earlier call for this prefix.
+
+        Per-prefix state keeps the set of processed keys, the samples left over
+        after the last full window (so windows straddling two calls are still
+        analyzed once) and the running _ToneAggregate, so download, decode and
+        inference cost O(new audio); the listing and the returned summary grow
+        with the session. Processed keys are a set, not a StartAfter cursor:
+        uploader keys carry unpadded counters, so "frame_10_..." sorts before
+        "frame_9_..." as a string. New frames are appended in natural key order;
+        one that arrives late is appended after the audio already analyzed.
+        Unlike the full path, audio is normalized by the running session peak
+        (earlier windows cannot be rescaled) and not trimmed (trimming would shift
+        the session timeline); the VAD gate drops the silence instead.
+        Session state is only updated once the whole batch has been analyzed.
+        """
+        session = self._session(bucket, prefix)
+        with session.lock:
+            listed, listed_sizes = self._list_audio_keys(s3, bucket, prefix)
+            new = [(k, size) for k, size in zip(listed, listed_sizes) if k not in session.seen]
+            keys, sizes = [k for k, _ in new], [size for _, size in new]
+            if not keys:
+                return session.analysis(), 0, session.file_count, session.total_bytes, _empty_timings()
+
+            waveforms, timings = fetch_and_decode(s3, bucket, keys, sizes, sr=16000)
+            _check_cancel(cancel)
+            metrics.count_frames("tone", processed=len(keys))
+
+            new_audio = np.concatenate(waveforms) if len(waveforms) > 1 else waveforms[0]
+            peak = max(session.peak, float(np.max(np.abs(new_audio)))) if new_audio.size else session.peak
+            if peak > 0:
+                new_audio = new_audio / peak
+            buf = np.concatenate([session.tail, new_audio.astype(np.float32, copy=False)])
+
+            sr_target = 16000
+            chunk_size = int(CHUNK_DUR * sr_target)
+            step = chunk_size - int(OVERLAP_DUR * sr_target)
+            n_full = (len(buf) - chunk_size) // step + 1 if len(buf) >= chunk_size else 0
+
+            results, gate_stats = [], {"windows_total": 0, "windows_skipped": 0}
+            if n_full:
+                starts = [i * step for i in range(n_full)]
+                windows = np.stack([buf[st:st + chunk_size] for st in starts])
+                with metrics.timed("vad"):
+                    mask, gate_stats = speech_window_mask(buf, sr_target, starts, chunk_size)
+                metrics.count_windows(gate_stats)
+                with metrics.timed("inference"):
+                    predictions = self.recognizer.predict_windows(windows, sr_target, mask)
+                for (emotion, conf), st in zip(predictions, starts):
+                    if emotion is None:
+                        continue
+                    abs_start = session.offset + st
+                    results.append({
+                        "emotion": emotion,
+                        "confidence": float(conf),
+                        "start": abs_start / sr_target,
+                        "end": (abs_start + chunk_size) / sr_target,
+                    })
+
+            _check_cancel(cancel)  # inference may have outlived the request; keep the frames for next time
+            consumed = n_full * step
+            session.aggregate.extend(results)
+            session.windows_total += gate_stats["windows_total"]
+            session.windows_skipped += gate_stats["windows_skipped"]
+            session.peak = peak
+            session.tail = buf[consumed:].copy()
+            session.offset += consumed
+            session.seen.update(keys)
+            session.file_count += len(keys)
+            session.total_bytes += sum(sizes)
+
+            return session.analysis(), timings["download_ms"], session.file_count, session.total_bytes, timings
+
+
+class _StreamSession:
+    """Incremental tone-analysis state for one user prefix."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.seen = set()  # keys already analyzed
+        self.tail = np.zeros(0, dtype=np.float32)
+        self.offset = 0  # absolute sample index of tail[0]
+        self.peak = 0.0  # running peak used for normalization
+        self.aggregate = _ToneAggregate()
+        self.windows_total = 0
+        self.windows_skipped = 0
+        self.file_count = 0
+        self.total_bytes = 0
+
+    def analysis(self) -> dict:
+        """The session summary, same shape whether or not this call found new frames."""
+        analysis = self.aggregate.to_dict() or _empty_analysis()
+        analysis["windows_total"] = self.windows_total
+        analysis["windows_skipped"] = self.windows_skipped
+        return analysis
 
 
 
@@ -0,0 +1,147 @@
+# s3_access.py
+"""
+Shared S3 access layer: one boto3 client per process (boto3 clients are
+thread-safe), a tuned connection pool, bounded concurrency and per-operation
+metrics (requests, bytes, latency).
+"""
+import os
+import threading
+import time
+
+import boto3
+from botocore.config import Config
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+S3_MAX_POOL = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32"))
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", str(S3_MAX_POOL)))
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", "5"))
+
+_STAGES = {"list": "s3_list", "get": "s3_download"}
+
+
+class S3Access:
+    def __init__(self, client=None, max_concurrency: int = S3_MAX_CONCURRENCY):
+        self._client = client
+        self._client_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = boto3.client(
+                        "s3",
+                        region_name=AWS_REGION,
+                        config=Config(
+                            max_pool_connections=S3_MAX_POOL,
+                            retries={"max_attempts": S3_MAX_ATTEMPTS, "mode": "standard"},
+                        ),
+                    )
+        return self._client
+
+    def _record(self, op: str, elapsed_s: float, nbytes: int = 0, error: bool = False):
+        metrics.observe(_STAGES.get(op, f"s3_{op}"), elapsed_s)
+        with self._metrics_lock:
+            m = self._metrics.setdefault(op, {"requests": 0, "errors": 0, "bytes": 0, "total_ms": 0.0, "max_ms": 0.0})
+            ms = elapsed_s * 1000
+            m["requests"] += 1
+            m["errors"] += int(error)
+            m["bytes"] += nbytes
+            m["total_ms"] += ms
+            m["max_ms"] = max(m["max_ms"], ms)
+
+    def _call(self, op: str, fn, *args, **kwargs):
+        with self._slots:
+            t0 = time.time()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                self._record(op, time.time() - t0, error=True)
+                raise
+        return result, time.time() - t0
+
+    def iter_objects(self, bucket: str, prefix: str, start_after: str | None = None):
+        """Yield object dicts (Key, Size, LastModified, ...) under prefix, one list call per page."""
+        params = {"Bucket": bucket, "Prefix": prefix}
+        if start_after:
+            params["StartAfter"] = start_after
+        token = None
+        while True:
+            if token:
+                params["ContinuationToken"] = token
+            page, elapsed = self._call("list", self.client.list_objects_v2, **params)
+            self._record("list", elapsed)
+            yield from page.get("Contents", []) or []
+            if not page.get("IsTruncated"):
+                return
+            token = page.get("NextContinuationToken")
+
+    def list_common_prefixes(self, bucket: str, prefix: str, delimiter: str = "/"):
+        """Return the CommonPrefixes strings directly under prefix."""
+        out, token = [], None
+        params = {"Bucket": bucket, "Prefix": prefix, "Delimiter": delimiter}
+        while True:
+            if token:
+                params["ContinuationToken"] = token
+            page, elapsed = self._call("list", self.client.list_objects_v2, **params)
+            self._record("list", elapsed)
+            out.extend(cp["Prefix"] for cp in page.get("CommonPrefixes", []) or [])
+            if not page.get("IsTruncated"):
+                return out
+            token = page.get("NextContinuationToken")
+
+    def _get_object_body(self, bucket: str, key: str) -> bytes:
+        return self.client.get_object(Bucket=bucket, Key=key)["Body"].read()
+
+    def get_bytes(self, bucket: str, key: str) -> bytes:
+        """
+        Download an object body into memory with a single GetObject (frames are
+        small; download_fileobj would add a HeadObject and a transfer manager).
+        """
+        data, elapsed = self._call("get", self._get_object_body, bucket, key)
+        self._record("get", elapsed, nbytes=len(data))
+        return data
+
+    def download_fileobj(self, bucket: str, key: str, fileobj):
+        """boto3-compatible download (so S3Access can stand in for a raw client)."""
+        fileobj.write(self.get_bytes(bucket, key))
+
+    def metrics(self) -> dict:
+        """Per-operation request count, errors, bytes and latency (avg/max ms)."""
+        with self._metrics_lock:
+            out = {}
+            for op, m in self._metrics.items():
+                avg = m["total_ms"] / m["requests"] if m["requests"] else 0.0
+                out[op] = {**m, "avg_ms": round(avg, 2), "total_ms": round(m["total_ms"], 2), "max_ms": round(m["max_ms"], 2)}
+            return out
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_s3() -> S3Access:
+    """The process-wide S3Access instance."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = S3Access()
+    return _shared
+
+
+def as_s3_access(s3_client=None) -> S3Access:
+    """Wrap an explicitly passed client (tests, other accounts) or return the shared one."""
+    if s3_client is None:
+        return get_s3()
+    if isinstance(s3_client, S3Access):
+        return s3_client
+    return S3Access(client=s3_client)
@@ -0,0 +1,110 @@
+# s3_audio_pipeline.py
+"""
+Bounded fetch-and-decode pipeline for S3 audio frames.
+
+Downloads and decodes run on separate thread pools, so the two overlap.
+Decoding is an ffmpeg subprocess per object (audio_decode), which runs
+outside the GIL; a process pool would only add pickling of the waveforms
+(and fork a server that already has torch loaded). Encoded bytes that are downloaded but
+not yet decoded are capped by max_inflight_bytes. Waveforms come back in key order.
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+from audio_decode import decode_to_float32
+from s3_access import S3Access
+
+DOWNLOAD_WORKERS = int(os.getenv("FETCH_DOWNLOAD_WORKERS", "8"))
+DECODE_WORKERS = int(os.getenv("FETCH_DECODE_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_INFLIGHT_BYTES = int(float(os.getenv("FETCH_MAX_INFLIGHT_MB", "64")) * 1024 * 1024)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(kind: str, workers: int):
+    """Process-wide executors, created on first use and reused across requests."""
+    with _pools_lock:
+        key = (kind, workers)
+        if key not in _pools:
+            _pools[key] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"s3-{kind}")
+        return _pools[key]
+
+
+def _download(s3, bucket: str, key: str):
+    t0 = time.time()
+    data = s3.get_bytes(bucket, key)
+    return data, (time.time() - t0) * 1000
+
+
+def _decode(data: bytes, suffix: str, sr: int):
+    """Decode encoded audio bytes to mono float32 at sr."""
+    t0 = time.time()
+    y = decode_to_float32(data, sr=sr, suffix=suffix)
+    return y, (time.time() - t0) * 1000
+
+
+def fetch_and_decode(s3: S3Access, bucket: str, keys: list[str], sizes: list[int], sr: int = 16000,
+                     download_workers: int = DOWNLOAD_WORKERS, decode_workers: int = DECODE_WORKERS,
+                     max_inflight_bytes: int = MAX_INFLIGHT_BYTES):
+    """
+    Fetch and decode keys concurrently.
+    Returns (waveforms in key order, timings) where timings has download_ms and
+    decode_ms (summed per object) and fetch_wall_ms (end to end).
+    decode_workers=0 decodes on the download threads instead of a separate pool.
+    Any download/decode error is raised, as in the serial path, after cancelling
+    the downloads and decodes still queued.
+    """
+    timings = {"download_ms": 0, "decode_ms": 0, "fetch_wall_ms": 0}
+    if not keys:
+        return [], timings
+
+    t0 = time.time()
+    dl_pool = _pool("download", download_workers)
+    dec_pool = _pool("decode", decode_workers) if decode_workers > 0 else dl_pool
+
+    n = len(keys)
+    results = [None] * n
+    download_ms = decode_ms = 0.0
+    inflight = 0
+    next_i = 0
+    finished = 0
+    downloading, decoding = {}, {}
+
+    try:
+        while finished < n:
+            # Admit downloads while under the in-flight cap (always admit one so huge objects still progress)
+            while next_i < n and (inflight == 0 or inflight + sizes[next_i] <= max_inflight_bytes):
+                downloading[dl_pool.submit(_download, s3, bucket, keys[next_i])] = next_i
+                inflight += sizes[next_i]
+                next_i += 1
+
+            done, _ = wait(list(downloading) + list(decoding), return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut in downloading:
+                    i = downloading.pop(fut)
+                    data, ms = fut.result()
+                    download_ms += ms
+                    suffix = (os.path.splitext(keys[i])[1] or ".wav").lower()
+                    decoding[dec_pool.submit(_decode, data, suffix, sr)] = i
+                else:
+                    i = decoding.pop(fut)
+                    y, ms = fut.result()
+                    decode_ms += ms
+                    metrics.observe("decode", ms / 1000)
+                    results[i] = y
+                    inflight -= sizes[i]
+                    finished += 1
+    except BaseException:
+        # don't leave queued downloads/decodes running for a request that already failed
+        for fut in list(downloading) + list(decoding):
+            fut.cancel()
+        raise
+
+    timings["download_ms"] = int(download_ms)
+    timings["decode_ms"] = int(decode_ms)
+    timings["fetch_wall_ms"] = int((time.time() - t0) * 1000)
+    return results, timings
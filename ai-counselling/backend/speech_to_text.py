@@ -1,23 +1,22 @@
 # sr_transcribe_s3_auto_robust.py
-import os, tempfile, subprocess, json
-from io import BytesIO
+import os, json
 from pathlib import Path
 from dotenv import load_dotenv
-import boto3
-from botocore.config import Config
-from pydub import AudioSegment, effects
-from pydub.effects import high_pass_filter, low_pass_filter, compress_dynamic_range
-import speech_recognition as sr
+import metrics
+from s3_access import get_s3
+from pydub import AudioSegment
+from audio_preprocess import preprocess_segment
+from transcription import get_executor
+from audio_decode import ffmpeg_decode, decode_to_segment
+from mongodb_fetcher import fetch_latest_audio_frames
 
 # ---------- config ----------
 CHUNK_SEC = 50
-LANG = "en-US"
 MIN_SIZE_BYTES = 8192   # skip tiny/partial chunks
 # ---------------------------
 
 load_dotenv()
 
-AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 S3_BUCKET  = os.getenv("DEFAULT_BUCKET")
 USERS_BASE_PREFIX = os.getenv("USERS_BASE_PREFIX", "users/")
 RECORD_SUBPATH    = os.getenv("RECORD_SUBPATH", "audio/webm/")
@@ -26,80 +25,78 @@ if not S3_BUCKET:
     raise SystemExit("Set S3_BUCKET (and AWS creds) in .env")
 
 def _s3():
-    return boto3.client(
-        "s3",
-        region_name=AWS_REGION,
-        config=Config(retries={"max_attempts": 5, "mode": "standard"})
-    )
+    # process-wide client with pooled connections (see s3_access)
+    return get_s3()
 
 def list_users(bucket: str, base_prefix: str):
     s3 = _s3()
     out = []
-    paginator = s3.get_paginator("list_objects_v2")
-    for page in paginator.paginate(Bucket=bucket, Prefix=base_prefix.rstrip("/") + "/", Delimiter="/"):
-        for cp in page.get("CommonPrefixes", []) or []:
-            out.append(cp["Prefix"].split("/", 1)[1].rstrip("/"))  # user_xxx
+    for prefix in s3.list_common_prefixes(bucket, base_prefix.rstrip("/") + "/"):
+        out.append(prefix.split("/", 1)[1].rstrip("/"))  # user_xxx
     return out
 
 def list_latest_objects(bucket: str, users_base: str, record_subpath: str, limit=50):
     """Return newest objects across ALL users, sorted desc by LastModified."""
     s3 = _s3()
     items = []
-    paginator = s3.get_paginator("list_objects_v2")
     users = list_users(bucket, users_base)
     for user in users:
         prefix = f"{users_base.rstrip('/')}/{user}/{record_subpath.strip('/')}/"
-        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-            for obj in page.get("Contents", []) or []:
-                key, size, ts = obj["Key"], obj.get("Size", 0), obj.get("LastModified")
-                if key.endswith("/") or size < MIN_SIZE_BYTES:  # skip folders & tiny chunks
-                    continue
-                items.append({"Key": key, "Size": size, "LastModified": ts})
+        for obj in s3.iter_objects(bucket, prefix):
+            key, size, ts = obj["Key"], obj.get("Size", 0), obj.get("LastModified")
+            if key.endswith("/") or size < MIN_SIZE_BYTES:  # skip folders & tiny chunks
+                continue
+            items.append({"Key": key, "Size": size, "LastModified": ts})
     items.sort(key=lambda x: x["LastModified"], reverse=True)
     return items[:limit]
 
-def download_to_temp(bucket: str, key: str) -> str:
+def list_user_latest_objects(bucket: str, user_id: str, limit=50):
+    """
+    Newest objects for ONE user, sorted desc.
+    Uses the indexed audio_frames collection; if Mongo is unavailable or has no rows,
+    lists only this user's prefix (never the whole bucket).
+    """
+    try:
+        frames = fetch_latest_audio_frames(user_id, limit=limit, min_bytes=MIN_SIZE_BYTES)
+    except Exception as e:
+        print(f"audio_frames lookup failed, listing S3 prefix instead: {e}")
+        frames = []
+    if frames:
+        return [{"Key": f["s3Key"], "Size": f.get("bytes", 0), "LastModified": f.get("ts_ms")} for f in frames]
+
     s3 = _s3()
-    suffix = Path(key).suffix or ".bin"
-    tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
-    tmp_path = tmp.name; tmp.close()
-    with open(tmp_path, "wb") as f:
-        s3.download_fileobj(bucket, key, f)
-    return tmp_path
+    prefix = f"{USERS_BASE_PREFIX.rstrip('/')}/{user_id}/{RECORD_SUBPATH.strip('/')}/"
+    items = []
+    for obj in s3.iter_objects(bucket, prefix):
+        key, size, ts = obj["Key"], obj.get("Size", 0), obj.get("LastModified")
+        if key.endswith("/") or size < MIN_SIZE_BYTES:
+            continue
+        items.append({"Key": key, "Size": size, "LastModified": ts})
+    items.sort(key=lambda x: x["LastModified"], reverse=True)
+    return items[:limit]
+
+def download_bytes(bucket: str, key: str) -> bytes:
+    """Stream an object body into memory (no temp file)."""
+    return _s3().get_bytes(bucket, key)
 
 # ---- robust decode helpers ----
-def ffmpeg_decode_to_wav_bytes(in_path: str) -> bytes:
-    """Try a tolerant ffmpeg transcode to mono 16k WAV -> bytes."""
-    cmd = [
-        "ffmpeg", "-v", "error",
-        "-fflags", "+genpts+discardcorrupt",
-        "-err_detect", "ignore_err",
-        "-i", in_path,
-        "-ac", "1", "-ar", "16000",
-        "-f", "wav", "pipe:1"
-    ]
-    return subprocess.check_output(cmd, stderr=subprocess.STDOUT)
-
-def load_audio_robust(in_path: str) -> AudioSegment:
+def ffmpeg_decode_to_wav_bytes(data: bytes, suffix: str | None = None) -> bytes:
+    """Tolerant ffmpeg transcode of encoded bytes to mono 16k WAV -> bytes (pipe in, pipe out)."""
+    return ffmpeg_decode(data, sr=16000, fmt="wav", suffix=suffix)
+
+def load_audio_robust(data: bytes, suffix: str | None = None) -> AudioSegment:
     """
-    Try pydub first; if it fails, fall back to ffmpeg CLI to WAV bytes.
+    Tolerant in-memory decode (ffmpeg pipe) to mono 16k 16-bit PCM.
     Raise on hard failure so caller can try an older object.
     """
-    try:
-        return AudioSegment.from_file(in_path)
-    except Exception:
-        # Fallback: tolerant decode to WAV bytes
-        pcm = ffmpeg_decode_to_wav_bytes(in_path)
-        return AudioSegment.from_file(BytesIO(pcm), format="wav")
+    with metrics.timed("decode"):
+        return decode_to_segment(data, sr=16000, suffix=suffix)
 
 # ---- preprocessing + ASR ----
 def preprocess(seg: AudioSegment) -> AudioSegment:
-    seg = seg.set_channels(1).set_frame_rate(16000)
-    seg = high_pass_filter(seg, cutoff=100)
-    seg = low_pass_filter(seg, cutoff=8000)
-    seg = effects.normalize(seg)
-    seg = compress_dynamic_range(seg, threshold=-20.0, ratio=4.0, attack=5, release=50)
-    return seg
+    # shared NumPy/SciPy chain (see audio_preprocess)
+    with metrics.timed("preprocess"):
+        return preprocess_segment(seg, sr=16000)
 
 def chunk(seg: AudioSegment, seconds=CHUNK_SEC):
     step = int(seconds * 1000)
@@ -107,39 +104,15 @@ def chunk(seg: AudioSegment, seconds=CHUNK_SEC):
 
 def transcribe_key(bucket: str, key: str) -> str:
     print(f"Trying: s3://{bucket}/{key}")
-    local = download_to_temp(bucket, key)
-    try:
-        raw = load_audio_robust(local)      # <-- tolerant loader
-        audio = preprocess(raw)
-        parts = chunk(audio)
-        r = sr.Recognizer()
-        texts = []
-        with tempfile.TemporaryDirectory() as td:
-            for i, p in enumerate(parts, 1):
-                wav_path = os.path.join(td, f"part_{i}.wav")
-                p.export(wav_path, format="wav")
-                with sr.AudioFile(wav_path) as src:
-                    r.adjust_for_ambient_noise(src, duration=0.3)
-                    audio_chunk = r.record(src)
-                try:
-                    res = r.recognize_google(audio_chunk, language=LANG, show_all=True)
-                    if isinstance(res, dict) and res.get("alternative"):
-                        best = max(res["alternative"], key=lambda a: a.get("confidence", 0))
-                        texts.append((best.get("transcript") or "").strip())
-                    else:
-                        texts.append(r.recognize_google(audio_chunk, language=LANG).strip())
-                    print(f"[{i}/{len(parts)}] ✓")
-                except sr.UnknownValueError:
-                    print(f"[{i}/{len(parts)}] (no speech recognized)")
-                except sr.RequestError as e:
-                    raise SystemExit(f"[{i}/{len(parts)}] API error: {e}")
-        out = " ".join(t for t in texts if t).strip()
-        if not out:
-            raise RuntimeError("Empty transcript (audio may be silence).")
-        return out
-    finally:
-        try: os.remove(local)
-        except OSError: pass
+    data = download_bytes(bucket, key)
+    raw = load_audio_robust(data, suffix=Path(key).suffix)      # <-- tolerant loader
+    audio = preprocess(raw)
+    parts = chunk(audio)
+    texts = get_executor().transcribe_parts(parts)
+    out = " ".join(t for t in texts if t).strip()
+    if not out:
+        raise RuntimeError("Empty transcript (audio may be silence).")
+    return out
 
 def collect_last_k_decodable(bucket: str, candidates: list[dict], k: int = 3):
     """Try candidates newest->oldest, decode those that work (up to k), return a single concatenated AudioSegment."""
@@ -147,17 +120,15 @@ def collect_last_k_decodable(bucket: str, candidates: list[dict], k: int = 3):
     for obj in candidates:
         key = obj["Key"]
         try:
-            local = download_to_temp(bucket, key)
-            raw = load_audio_robust(local)
+            raw = load_audio_robust(download_bytes(bucket, key), suffix=Path(key).suffix)
             got.append(raw)
+            metrics.count_frames("asr", processed=1)
             print(f"collected: {key}")
             if len(got) >= k:
                 break
         except Exception as e:
+            metrics.count_frames("asr", skipped=1)
             print(f"skip {key}: {e}")
-        finally:
-            try: os.remove(local)
-            except: pass
     if not got:
         raise RuntimeError("No decodable audio found.")
     # concatenate and preprocess once
@@ -166,31 +137,18 @@ def collect_last_k_decodable(bucket: str, candidates: list[dict], k: int = 3):
         merged += seg
     return preprocess(merged)
 
-def transcribe_latest_concat(bucket: str, k: int = 3, pool=30) -> str:
-    # newest N across all users (you already have list_latest_objects)
-    candidates = list_latest_objects(bucket, USERS_BASE_PREFIX, RECORD_SUBPATH, limit=pool)
+def transcribe_latest_concat(bucket: str, k: int = 3, pool=30, user_id: str | None = None, on_part=None) -> str:
+    """
+    Transcript of the newest k decodable recordings. on_part(index, text) sees
+    each recognized chunk as it lands and can stop the rest (see
+    TranscriptionExecutor.transcribe_parts).
+    """
+    if user_id:
+        # newest N for this user only (indexed lookup)
+        candidates = list_user_latest_objects(bucket, user_id, limit=pool)
+    else:
+        # newest N across all users (full bucket listing)
+        candidates = list_latest_objects(bucket, USERS_BASE_PREFIX, RECORD_SUBPATH, limit=pool)
     merged = collect_last_k_decodable(bucket, candidates, k=k)
     parts = chunk(merged)
-    r = sr.Recognizer()
-    out = []
-    with tempfile.TemporaryDirectory() as td:
-        for i, p in enumerate(parts, 1):
-            wav = os.path.join(td, f"part_{i}.wav")
-            p.export(wav, format="wav")
-            with sr.AudioFile(wav) as src:
-                r.adjust_for_ambient_noise(src, duration=0.3)
-                audio_chunk = r.record(src)
-            try:
-                res = r.recognize_google(audio_chunk, language=LANG, show_all=True)
-                if isinstance(res, dict) and res.get("alternative"):
-                    best = max(res["alternative"], key=lambda a: a.get("confidence", 0))
-                    out.append((best.get("transcript") or "").strip())
-                else:
-                    out.append(r.recognize_google(audio_chunk, language=LANG).strip())
-                print(f"[{i}/{len(parts)}] ✓")
-            except sr.UnknownValueError:
-                print(f"[{i}/{len(parts)}] (no speech recognized)")
-            except sr.RequestError as e:
-                raise SystemExit(f"[{i}/{len(parts)}] API error: {e}")
-    return " ".join(t for t in out if t).strip()
-
+    return get_executor().transcribe(parts, on_part=on_part)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# backend modules are flat and imported top-level (as uvicorn main2:app does)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,72 @@
+import warnings
+
+import numpy as np
+import pytest
+
+warnings.filterwarnings("ignore", message="Couldn't find ffmpeg")
+
+from pydub import effects  # noqa: E402
+from pydub.effects import compress_dynamic_range, high_pass_filter, low_pass_filter  # noqa: E402
+
+import audio_preprocess  # noqa: E402
+from audio_preprocess import _attenuation, array_to_segment, preprocess_array, segment_to_array  # noqa: E402
+from benchmarks.fixtures import speech_like  # noqa: E402
+
+SR = 16000
+
+
+def pydub_chain(seg):
+    """The chain main2/speech_to_text ran before audio_preprocess."""
+    seg = seg.set_channels(1).set_frame_rate(SR)
+    seg = high_pass_filter(seg, cutoff=100)
+    seg = low_pass_filter(seg, cutoff=8000)
+    seg = effects.normalize(seg)
+    return compress_dynamic_range(seg, threshold=-20.0, ratio=4.0, attack=5, release=50)
+
+
+def bursty(duration_s, seed):
+    """Loud bursts over quiet speech: exercises attack, release and hold-below-threshold."""
+    y = speech_like(duration_s, seed=seed)
+    t = np.arange(len(y)) / SR
+    return (y * np.where(np.sin(2 * np.pi * 0.7 * t) > 0.3, 3.0, 0.3)).clip(-1, 1).astype(np.float32)
+
+
+@pytest.mark.parametrize("signal", [speech_like(4.0, seed=3), speech_like(3.0, seed=11), speech_like(3.0, seed=29), bursty(3.0, seed=5)],
+                         ids=["speech", "speech2", "speech3", "bursty"])
+def test_matches_pydub_chain(signal):
+    seg = array_to_segment(signal)
+    expected = segment_to_array(pydub_chain(seg))
+    got = preprocess_array(segment_to_array(seg))
+
+    assert got.shape == expected.shape
+    assert np.abs(got - expected).max() < 2e-2
+    rms_got, rms_expected = np.sqrt(np.mean(got ** 2)), np.sqrt(np.mean(expected ** 2))
+    assert abs(rms_got - rms_expected) / rms_expected < 0.01
+
+
+def test_empty_and_silent_input():
+    assert preprocess_array(np.zeros(0, dtype=np.float32)).size == 0
+    assert not preprocess_array(np.zeros(SR, dtype=np.float32)).any()
+
+
+def test_attenuation_matches_sequential_loop():
+    rng = np.random.default_rng(7)
+    n = 5000
+    target = rng.uniform(0, 12, n) * (rng.random(n) > 0.2)
+    live = (target > 0) * rng.integers(1, 9, n)
+    rise, fall = live * target / 80, live * target / 800  # zero rise/fall: hold
+
+    expected, a = [], 0.0
+    for t, up, down in zip(target, rise, fall):
+        a = min(a + up, t) if a <= t else max(a - down, t)
+        expected.append(a)
+    assert np.array_equal(_attenuation(target, rise, fall), expected)
+
+
+def test_blocks_do_not_change_output(monkeypatch):
+    y = bursty(6.0, seed=17)
+    whole = preprocess_array(y)
+    monkeypatch.setattr(audio_preprocess, "BLOCK", 4099)
+    blocked = preprocess_array(y)
+    assert blocked.dtype == np.float32
+    assert np.abs(blocked - whole).max() < 1e-6
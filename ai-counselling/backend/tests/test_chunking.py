@@ -0,0 +1,68 @@
+from chunking import chunk_text, is_heading, sections
+
+# Shaped like PyPDF2's extract_text on the DSM-5: hard-wrapped lines, a running
+# header with the page number on every page, a bare page number footer.
+PAGES = [
+    """Depressive Disorders 160
+MAJOR DEPRESSIVE DISORDER
+Diagnostic Criteria
+A. Five (or more) of the following symptoms have been present during the same 2-week
+period and represent a change from previous functioning.
+1. Depressed mood most of the day, nearly every day, as indicated by
+either subjective report (e.g., feels sad, empty, hopeless) or observation made by
+others (e.g., appears tearful).
+2. Markedly diminished interest or pleasure in all, or almost all, activities most of
+the day, nearly every day.
+160""",
+    """Depressive Disorders 161
+3. Significant weight loss when not dieting or weight gain, or decrease or
+increase in appetite nearly every day.
+Prevalence
+Twelve-month prevalence of major depressive disorder in the United States is
+approximately 7%. In one registry study covering
+2014 to 2018 the prevalence was
+stable across age groups.
+161""",
+    """162 Depressive Disorders
+PERSISTENT DEPRESSIVE
+DISORDER
+Diagnostic Criteria
+A. Depressed mood for most of the day, for more days than not, for at least 2 years.
+162""",
+]
+TEXT = "\f".join(PAGES)
+
+
+def test_wrapped_lines_and_page_furniture_are_not_headings():
+    for line in ("1. Depressed mood most of the day, nearly every day, as indicated by",
+                 "2014 to 2018 the prevalence was", "Page 160", "160", "12 of 947"):
+        assert not is_heading(line), line
+    for line in ("MAJOR DEPRESSIVE DISORDER", "Diagnostic Criteria", "2.1 Panic Disorder", "12 Anxiety Disorders"):
+        assert is_heading(line), line
+
+
+def test_sections_carry_the_heading_path():
+    got = sections(TEXT)
+    assert [heading for heading, _ in got] == [
+        "MAJOR DEPRESSIVE DISORDER\nDiagnostic Criteria",
+        "MAJOR DEPRESSIVE DISORDER\nPrevalence",
+        "PERSISTENT DEPRESSIVE DISORDER\nDiagnostic Criteria",
+    ]
+    criteria = " ".join(got[0][1].split()) + " " + " ".join(got[1][1].split())
+    assert "as indicated by either subjective report" in criteria
+    assert "3. Significant weight loss" in criteria
+    assert "2014 to 2018 the prevalence was stable" in got[1][1]
+    assert not any("Depressive Disorders" in body or "160" in body for _, body in got)
+
+
+def test_every_chunk_starts_with_its_heading_path():
+    chunks = chunk_text(TEXT, max_tokens=40, overlap_tokens=10)
+    assert len(chunks) > 3
+    for chunk in chunks:
+        assert chunk.startswith(("MAJOR DEPRESSIVE DISORDER\n", "PERSISTENT DEPRESSIVE DISORDER\n"))
+        assert "Page" not in chunk and "Depressive Disorders 16" not in chunk
+
+
+def test_plain_text_without_pages_still_chunks():
+    text = "Introduction\nThis manual describes disorders. It is used by clinicians.\n"
+    assert chunk_text(text) == ["Introduction\nThis manual describes disorders. It is used by clinicians."]
@@ -0,0 +1,68 @@
+import pytest
+
+from crisis_screen import PartialScreen, is_high_risk, matches
+
+# The substring check this screen replaced (main2.CRISIS_TERMS before the automaton)
+OLD_CRISIS_TERMS = {"suicide", "kill myself", "end my life", "self harm", "overdose", "hurt myself"}
+
+
+def old_is_high_risk(text: str) -> bool:
+    text = (text or "").lower()
+    return any(term in text for term in OLD_CRISIS_TERMS)
+
+
+@pytest.mark.parametrize("text", [
+    # every old term; suffixes "", s, d, ed, ing; bare, sentence, mid-clause,
+    # exclaimed and parenthesised; lower, UPPER and Title case
+    "suicide",
+    "Suicides are all I read about",
+    "I OVERDOSED.",
+    "honestly, i self harmed last night",
+    "Thinking About Self Harming!!",
+    "(kill myself)",
+    "I hurt myself",
+    "sometimes I want to END MY LIFE",
+    # boundaries: punctuation on either side, start and end of text, a longer word after
+    "overdose, again",
+    "...suicide",
+    "hurt myself.",
+    "kill myselfff",
+])
+def test_everything_the_old_check_caught_is_still_caught(text):
+    assert old_is_high_risk(text)
+    assert is_high_risk(text)
+
+
+@pytest.mark.parametrize("text", [
+    "I overdosed last night",
+    "I self harmed yesterday",
+    "thinking about suicides",
+    "I harmed myself again",
+    "I cut myself",
+    "Self-harm is all I think about",
+    "I just want to die.",
+    "I'm having suicidal thoughts",
+])
+def test_flags_inflected_and_reworded_phrases(text):
+    assert is_high_risk(text)
+
+
+@pytest.mark.parametrize("text", [
+    "I want to diet before summer",
+    "that skill myself and others practise",
+    "I feel a bit anxious about exams",
+    "",
+])
+def test_left_boundary_and_whole_word_phrases(text):
+    assert not is_high_risk(text)
+
+
+def test_matches_reports_phrases_in_order():
+    assert matches("I hurt myself and thought about suicide") == ["hurt myself", "suicide"]
+
+
+def test_partial_screen_finds_phrase_split_across_chunks():
+    screen = PartialScreen()
+    assert not screen.feed(1, "myself yesterday")
+    assert screen.feed(0, "sometimes I want to kill")
+    assert screen.hits == ["kill myself"]
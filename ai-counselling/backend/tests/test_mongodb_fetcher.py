@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("mongomock")
+
+import cache  # noqa: E402
+import mongodb_fetcher  # noqa: E402
+from benchmarks.stubs import fake_mongo  # noqa: E402
+
+USER = "user_test_1"
+
+
+@pytest.fixture
+def db():
+    with fake_mongo() as db:
+        db["users"].insert_one({
+            "clerk_user_id": USER,
+            "email": "someone@example.com",
+            "onboarded": True,
+            "onboarding": {"mode": "voice", "concerns": ["sleep"]},
+        })
+        yield db
+
+
+def test_profile_is_projected(db):
+    profile = mongodb_fetcher.fetch_user_profile(USER)
+    assert profile == {"onboarded": True, "onboarding": {"mode": "voice", "concerns": ["sleep"]}}
+
+
+def test_unknown_user_is_empty(db):
+    assert mongodb_fetcher.fetch_user_profile("nobody") == {}
+
+
+def test_second_fetch_is_served_from_cache(db):
+    mongodb_fetcher.fetch_user_profile(USER)
+    db["users"].update_one({"clerk_user_id": USER}, {"$set": {"onboarding.mode": "text"}})
+    hits = mongodb_fetcher.profiles.hits
+
+    assert mongodb_fetcher.fetch_user_profile(USER)["onboarding"]["mode"] == "voice"
+    assert mongodb_fetcher.profiles.hits == hits + 1
+
+
+def test_invalidate_user_busts_the_cache(db):
+    mongodb_fetcher.fetch_user_profile(USER)
+    db["users"].update_one({"clerk_user_id": USER}, {"$set": {"onboarding.mode": "text"}})
+    mongodb_fetcher.invalidate_user(USER)
+
+    assert mongodb_fetcher.fetch_user_profile(USER)["onboarding"]["mode"] == "text"
+
+
+def test_async_falls_back_to_sync_client_without_motor(db):
+    # fake_mongo makes _motor_db() return None, as when motor is not installed
+    profile = asyncio.run(mongodb_fetcher.fetch_user_profile_async(USER))
+    assert profile["onboarding"]["mode"] == "voice"
+    assert mongodb_fetcher.profiles.get(USER) == (None, profile)
+
+
+class _RacingUsers:
+    """Motor-like collection whose find_one sees an invalidation land mid-read."""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def find_one(self, query, projection=None):
+        stale = self.db["users"].find_one(query, projection=projection)
+        self.db["users"].update_one(query, {"$set": {"onboarding.mode": "text"}})
+        mongodb_fetcher.invalidate_user(query["clerk_user_id"])
+        await asyncio.sleep(0)
+        return stale
+
+
+def test_invalidation_during_async_fetch_is_not_overwritten(db, monkeypatch):
+    monkeypatch.setattr(mongodb_fetcher, "_motor_db", lambda: {"users": _RacingUsers(db)})
+    monkeypatch.setattr(mongodb_fetcher, "_users_index_ready", True)
+
+    stale = asyncio.run(mongodb_fetcher.fetch_user_profile_async(USER))
+    assert stale["onboarding"]["mode"] == "voice"
+    assert mongodb_fetcher.profiles.get(USER) is None
+
+    monkeypatch.setattr(mongodb_fetcher, "_motor_db", lambda: None)
+    assert mongodb_fetcher.fetch_user_profile(USER)["onboarding"]["mode"] == "text"
+
+
+def test_invalidation_reaches_workers_sharing_the_cache_db(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "caches", {})
+    shared = cache.DiskCache(str(tmp_path / "cache.db"))
+    worker_a = cache.TTLCache("user_profile", ttl_s=300, disk=shared)
+    worker_b = cache.TTLCache("user_profile", ttl_s=300, disk=shared)
+
+    monkeypatch.setattr(mongodb_fetcher, "profiles", worker_a)
+    assert mongodb_fetcher.fetch_user_profile(USER)["onboarding"]["mode"] == "voice"
+
+    # the web app's invalidation lands on the other worker
+    db["users"].update_one({"clerk_user_id": USER}, {"$set": {"onboarding.mode": "text"}})
+    monkeypatch.setattr(mongodb_fetcher, "profiles", worker_b)
+    mongodb_fetcher.invalidate_user(USER)
+
+    monkeypatch.setattr(mongodb_fetcher, "profiles", worker_a)
+    assert mongodb_fetcher.fetch_user_profile(USER)["onboarding"]["mode"] == "text"
+    assert mongodb_fetcher.fetch_user_profile(USER)["onboarding"]["mode"] == "text"
+    assert worker_a.hits >= 1
@@ -0,0 +1,138 @@
+# transcription.py
+"""
+Concurrent chunked speech recognition.
+
+Chunks are recognized on a shared thread pool (recognize_google is network
+bound) and reassembled in order. Every chunk costs exactly one backend call.
+The backend is any callable AudioData -> str, so tests and offline runs can
+swap Google for a stub or a local engine.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import speech_recognition as sr
+from pydub import AudioSegment
+
+import metrics
+
+LANG = "en-US"
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", "4"))
+
+
+def to_audio_data(seg: AudioSegment) -> sr.AudioData:
+    """
+    Hand PCM straight to the recognizer instead of a WAV round-trip through disk.
+    (The old adjust_for_ambient_noise + record() pair only tuned energy_threshold,
+    which record() ignores, and dropped the first 0.3 s of every chunk.)
+    """
+    seg = seg.set_channels(1).set_sample_width(2)
+    return sr.AudioData(seg.raw_data, seg.frame_rate, seg.sample_width)
+
+
+class GoogleBackend:
+    """Google Web Speech API; one show_all request per chunk, best alternative wins."""
+
+    def __init__(self, language: str = LANG):
+        self.language = language
+
+    def __call__(self, audio: sr.AudioData) -> str:
+        r = sr.Recognizer()
+        res = r.recognize_google(audio, language=self.language, show_all=True)
+        # show_all returns [] (not UnknownValueError) when nothing was recognized,
+        # so a plain retry would only ever raise; treat it as an empty chunk.
+        if isinstance(res, dict) and res.get("alternative"):
+            best = max(res["alternative"], key=lambda a: a.get("confidence", 0))
+            return (best.get("transcript") or "").strip()
+        return ""
+
+
+class StubBackend:
+    """Offline backend: returns a fixed text (ASR_STUB_TEXT) for every chunk."""
+
+    def __init__(self, text: str | None = None):
+        self.text = os.getenv("ASR_STUB_TEXT", "") if text is None else text
+
+    def __call__(self, audio: sr.AudioData) -> str:
+        return self.text
+
+
+BACKENDS = {"google": GoogleBackend, "stub": StubBackend}
+
+
+class TranscriptionExecutor:
+    def __init__(self, backend=None, workers: int = ASR_WORKERS):
+        self.backend = backend or BACKENDS[os.getenv("ASR_BACKEND", "google")]()
+        self.workers = max(1, workers)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="asr")
+            return self._pool
+
+    def _recognize(self, i: int, n: int, audio: sr.AudioData) -> str:
+        try:
+            with metrics.timed("asr"):
+                text = self.backend(audio)
+            print(f"[{i}/{n}] ✓" if text else f"[{i}/{n}] (no speech recognized)")
+            return text
+        except sr.UnknownValueError:
+            print(f"[{i}/{n}] (no speech recognized)")
+            return ""
+        except sr.RequestError as e:
+            raise RuntimeError(f"[{i}/{n}] API error: {e}") from e
+
+    def transcribe_parts(self, parts: list[AudioSegment], on_part=None) -> list[str]:
+        """
+        Recognize each chunk concurrently; returns one text per chunk, in order.
+        on_part(index, text) is called as each chunk finishes (in completion
+        order); if it returns True, chunks not yet recognized are skipped and
+        come back as "".
+        """
+        n = len(parts)
+        if n == 0:
+            return []
+        texts = [""] * n
+        if n == 1 or self.workers == 1:
+            for i, p in enumerate(parts):
+                texts[i] = self._recognize(i + 1, n, to_audio_data(p))
+                if on_part is not None and on_part(i, texts[i]):
+                    break
+            return texts
+        futures = {self._executor().submit(self._recognize, i + 1, n, to_audio_data(p)): i
+                   for i, p in enumerate(parts)}
+        try:
+            for fut in as_completed(futures):
+                i = futures[fut]
+                texts[i] = fut.result()
+                if on_part is not None and on_part(i, texts[i]):
+                    print(f"stopping early after chunk {i + 1}/{n}")
+                    break
+        finally:
+            for fut in futures:
+                fut.cancel()
+        return texts
+
+    def transcribe(self, parts: list[AudioSegment], on_part=None) -> str:
+        return " ".join(t for t in self.transcribe_parts(parts, on_part) if t).strip()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_executor() -> TranscriptionExecutor:
+    """Process-wide executor (backend from ASR_BACKEND, workers from ASR_WORKERS)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = TranscriptionExecutor()
+        return _default
+
+
+def set_backend(backend):
+    """Swap the recognizer backend of the shared executor (e.g. a stub in tests)."""
+    get_executor().backend = backend
@@ -0,0 +1,97 @@
+# vad.py
+"""
+Framewise voice-activity gate.
+
+RMS, zero-crossing rate and spectral centroid are computed once over the whole
+waveform (strided frame views, no per-window librosa calls) and then pooled per
+analysis window with prefix sums. Thresholds match
+EnsembleEmotionRecognizer.is_valid_speech.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+FRAME_LENGTH = 2048   # librosa defaults for zcr / spectral_centroid
+HOP_LENGTH = 512
+BLOCK_FRAMES = 1024   # frames per FFT block, bounds peak memory on long sessions
+
+RMS_MIN = 0.005
+ZCR_MAX = 0.4
+CENTROID_MIN = 300.0
+CENTROID_MAX = 8000.0
+
+
+def frame_features(y: np.ndarray, sr: int, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH):
+    """
+    Centered frames over the full signal.
+    Returns (zcr, centroid), one value per frame; frame i is centered on sample i * hop_length.
+    """
+    y = np.asarray(y, dtype=np.float32)
+    pad = frame_length // 2
+    padded = np.pad(y, pad, mode="constant")
+    if len(padded) < frame_length:
+        return np.zeros(0), np.zeros(0)
+
+    frames = sliding_window_view(padded, frame_length)[::hop_length]  # view, no copy
+    n = frames.shape[0]
+
+    # periodic Hann, as used by librosa's STFT
+    win = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame_length) / frame_length)).astype(np.float32)
+    freqs = np.fft.rfftfreq(frame_length, d=1.0 / sr)
+
+    zcr = np.empty(n, dtype=np.float64)
+    centroid = np.empty(n, dtype=np.float64)
+    for b in range(0, n, BLOCK_FRAMES):
+        fr = frames[b:b + BLOCK_FRAMES]
+
+        signs = np.signbit(fr)
+        zcr[b:b + len(fr)] = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        mag = np.abs(np.fft.rfft(fr * win, axis=1))
+        total = mag.sum(axis=1)
+        num = mag @ freqs
+        centroid[b:b + len(fr)] = np.divide(num, total, out=np.zeros_like(num), where=total > 0)
+
+    return zcr, centroid
+
+
+def speech_window_mask(y: np.ndarray, sr: int, starts, chunk_size: int,
+                       hop_length=HOP_LENGTH, frame_length=FRAME_LENGTH):
+    """
+    Boolean mask over analysis windows [start, start + chunk_size) that look like speech,
+    plus counters: windows_total, windows_skipped, skipped_silence, skipped_noise.
+    Windows past the end of y are treated as zero-padded (as in _frame_windows).
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    n_win = len(starts)
+    stats = {"windows_total": int(n_win), "windows_skipped": 0, "skipped_silence": 0, "skipped_noise": 0}
+    if n_win == 0:
+        return np.zeros(0, dtype=bool), stats
+
+    y = np.asarray(y, dtype=np.float32)
+    ends = starts + chunk_size
+
+    # RMS over the (zero-padded) window, exact, via prefix sums of y^2
+    sq = np.concatenate(([0.0], np.cumsum(y.astype(np.float64) ** 2)))
+    sq_sum = sq[np.minimum(ends, len(y))] - sq[np.minimum(starts, len(y))]
+    rms = np.sqrt(sq_sum / chunk_size)
+
+    # Pool frame features over the frames centered inside each window
+    zcr, centroid = frame_features(y, sr, frame_length=frame_length, hop_length=hop_length)
+    n_frames = len(zcr)
+    zcr_cs = np.concatenate(([0.0], np.cumsum(zcr)))
+    cen_cs = np.concatenate(([0.0], np.cumsum(centroid)))
+    f0 = np.minimum(-(-starts // hop_length), n_frames)
+    f1 = np.minimum(-(-ends // hop_length), n_frames)
+    count = np.maximum(f1 - f0, 1)
+    zcr_mean = (zcr_cs[f1] - zcr_cs[f0]) / count
+    cen_mean = (cen_cs[f1] - cen_cs[f0]) / count
+    has_frames = f1 > f0
+
+    silent = rms < RMS_MIN
+    noisy = has_frames & ((zcr_mean > ZCR_MAX) | (cen_mean < CENTROID_MIN) | (cen_mean > CENTROID_MAX))
+    mask = ~silent & ~noisy
+
+    stats["windows_skipped"] = int(n_win - mask.sum())
+    stats["skipped_silence"] = int(silent.sum())
+    stats["skipped_noise"] = int((noisy & ~silent).sum())
+    return mask, stats
@@ -0,0 +1,212 @@
+# video_analysis.py
+"""
+Face-emotion analysis for uploaded clips.
+
+Instead of running DeepFace on every decoded frame, frames are sampled
+(fixed FPS, or on scene changes), downscaled, checked for a face with a cheap
+Haar cascade, and only frames with a face reach the emotion model, in batches.
+Skipped frames are grabbed but never decoded.
+"""
+import os
+from collections import Counter
+
+import cv2
+import numpy as np
+from deepface import DeepFace
+
+from model_registry import registry
+
+NO_FACE = "No face"
+
+VIDEO_SAMPLE_MODE = os.getenv("VIDEO_SAMPLE_MODE", "fps")          # "fps" or "scene"
+VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", "2"))
+VIDEO_SCENE_CHECK_FPS = float(os.getenv("VIDEO_SCENE_CHECK_FPS", "8"))
+VIDEO_SCENE_THRESHOLD = float(os.getenv("VIDEO_SCENE_THRESHOLD", "0.25"))
+VIDEO_MAX_SIDE = int(os.getenv("VIDEO_MAX_SIDE", "480"))
+VIDEO_BATCH_SIZE = int(os.getenv("VIDEO_BATCH_SIZE", "8"))
+VIDEO_FACE_PRECHECK = os.getenv("VIDEO_FACE_PRECHECK", "1") == "1"
+
+
+def _load_deepface_emotion():
+    try:
+        return DeepFace.build_model(task="facial_attribute", model_name="Emotion")
+    except TypeError:
+        # older deepface releases take the model name only
+        return DeepFace.build_model("Emotion")
+
+
+def _warmup_deepface(_model):
+    DeepFace.analyze(np.zeros((48, 48, 3), dtype=np.uint8), actions=['emotion'], enforce_detection=False)
+
+
+# Used inside the inference worker processes only (see execution.run_inference)
+MODELS = ("deepface_emotion", "face_cascade")
+
+registry.register("deepface_emotion", _load_deepface_emotion, warmup=_warmup_deepface)
+registry.register(
+    "face_cascade",
+    lambda: cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml"),
+)
+
+
+class VideoEmotionEngine:
+    def __init__(self, mode=VIDEO_SAMPLE_MODE, sample_fps=VIDEO_SAMPLE_FPS,
+                 scene_check_fps=VIDEO_SCENE_CHECK_FPS, scene_threshold=VIDEO_SCENE_THRESHOLD,
+                 max_side=VIDEO_MAX_SIDE, batch_size=VIDEO_BATCH_SIZE, face_precheck=VIDEO_FACE_PRECHECK):
+        self.mode = mode
+        self.sample_fps = sample_fps
+        self.scene_check_fps = scene_check_fps
+        self.scene_threshold = scene_threshold
+        self.max_side = max_side
+        self.batch_size = max(1, batch_size)
+        self.face_precheck = face_precheck
+        self._batch_ok = True  # flips off if this deepface build can't take a list of images
+
+    # ---- sampling ----
+    def _stride(self, native_fps: float, target_fps: float) -> int:
+        if not native_fps or native_fps <= 0 or target_fps <= 0:
+            return 1
+        return max(1, int(round(native_fps / target_fps)))
+
+    def _signature(self, frame: np.ndarray) -> np.ndarray:
+        small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (64, 36), interpolation=cv2.INTER_AREA)
+        hist = cv2.calcHist([small], [0], None, [32], [0, 256]).ravel()
+        return hist / max(hist.sum(), 1.0)
+
+    def sample_frames(self, cap, stats: dict | None = None):
+        """
+        Yield (frame_index, frame) for the frames worth analyzing; stats["total_frames"]
+        is filled in once the capture is exhausted.
+        fps mode: every Nth frame. scene mode: frames checked at scene_check_fps,
+        kept when their histogram moved more than scene_threshold (L1/2) since
+        the last kept frame.
+        Non-candidate frames are only grab()bed, never decoded.
+        """
+        native_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        target = self.sample_fps if self.mode == "fps" else self.scene_check_fps
+        stride = self._stride(native_fps, target)
+
+        idx = 0
+        last_sig = None
+        while True:
+            if not cap.grab():
+                break
+            if idx % stride == 0:
+                ok, frame = cap.retrieve()
+                if ok and frame is not None:
+                    if self.mode == "fps":
+                        yield idx, frame
+                    else:
+                        sig = self._signature(frame)
+                        if last_sig is None or 0.5 * float(np.abs(sig - last_sig).sum()) > self.scene_threshold:
+                            last_sig = sig
+                            yield idx, frame
+            idx += 1
+        if stats is not None:
+            stats["total_frames"] = idx
+
+    def ffmpeg_filter(self) -> str:
+        """
+        The same sampling as an ffmpeg -vf chain, for decoding from a pipe.
+        Scene mode uses ffmpeg's scene score (0..1) with the same threshold.
+        """
+        m = self.max_side
+        scale = f"scale='min(iw,{m})':'min(ih,{m})':force_original_aspect_ratio=decrease"
+        if self.mode == "fps":
+            return f"fps={self.sample_fps},{scale}"
+        return f"fps={self.scene_check_fps},select='eq(n,0)+gt(scene,{self.scene_threshold})',{scale}"
+
+    # ---- per-frame work ----
+    def _downscale(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        scale = self.max_side / max(h, w)
+        if scale >= 1.0:
+            return frame
+        return cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+    def _face_crop(self, frame: np.ndarray):
+        """Largest face (with margin) from the Haar cascade, or None if there is no face."""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        faces = registry.get("face_cascade").detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(40, 40))
+        if len(faces) == 0:
+            return None
+        x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+        m = int(0.15 * max(w, h))
+        return frame[max(0, y - m):y + h + m, max(0, x - m):x + w + m]
+
+    def _classify_one(self, img: np.ndarray, detector: str) -> str:
+        try:
+            result = DeepFace.analyze(img, actions=['emotion'], enforce_detection=False, detector_backend=detector)
+            return result[0]['dominant_emotion']
+        except Exception:
+            return NO_FACE
+
+    def _classify(self, imgs: list, detector: str) -> list[str]:
+        """Emotion per image; one batched DeepFace call when supported."""
+        registry.get("deepface_emotion")
+        if self._batch_ok and len(imgs) > 1:
+            try:
+                res = DeepFace.analyze(imgs, actions=['emotion'], enforce_detection=False, detector_backend=detector)
+                if len(res) == len(imgs) and all(isinstance(r, list) for r in res):
+                    return [r[0]['dominant_emotion'] if r else NO_FACE for r in res]
+            except Exception:
+                pass
+            self._batch_ok = False
+        return [self._classify_one(img, detector) for img in imgs]
+
+    def analyze_frames(self, frames) -> list[str]:
+        """Emotion label per sampled frame (NO_FACE when the pre-check finds none)."""
+        labels, pending, pending_pos = [], [], []
+        # With the pre-check the face is already cropped, so DeepFace can skip its detector
+        detector = "skip" if self.face_precheck else "opencv"
+
+        def flush():
+            for pos, label in zip(pending_pos, self._classify(pending, detector)):
+                labels[pos] = label
+            pending.clear()
+            pending_pos.clear()
+
+        for frame in frames:
+            small = self._downscale(frame)
+            img = self._face_crop(small) if self.face_precheck else small
+            labels.append(NO_FACE)
+            if img is None:
+                continue
+            pending.append(img)
+            pending_pos.append(len(labels) - 1)
+            if len(pending) >= self.batch_size:
+                flush()
+        if pending:
+            flush()
+        return labels
+
+    def analyze_path(self, path: str) -> dict:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError("Cannot open video file")
+        stats = {"total_frames": 0}
+        try:
+            emotions = self.analyze_frames(frame for _, frame in self.sample_frames(cap, stats))
+        finally:
+            cap.release()
+        return summarize_emotions(emotions, total_frames=stats["total_frames"])
+
+
+def summarize_emotions(emotions: list[str], total_frames: int) -> dict:
+    final_emotion = Counter(emotions).most_common(1)[0][0] if emotions else "No face detected"
+    return {
+        "emotions_per_frame": emotions,
+        "total_frames": total_frames,
+        "sampled_frames": len(emotions),
+        "final_emotion": final_emotion,
+    }
+
+
+def analyze_frame_batch(frames: list, **options) -> list[str]:
+    """Labels for frames already sampled and scaled by ffmpeg (picklable, for worker pools)."""
+    return VideoEmotionEngine(**options).analyze_frames(frames)
+
+
+def analyze_video_file(path: str, **options) -> dict:
+    """Module-level entry point (picklable, for worker pools)."""
+    return VideoEmotionEngine(**options).analyze_path(path)
@@ -0,0 +1,281 @@
+# video_stream.py
+"""
+Upload spooling with decode-while-receiving for /detect_video_emotions.
+
+The request body is consumed chunk by chunk (multipart or a raw video body),
+so memory per upload stays at one chunk. Each chunk is appended to a spool
+file and piped into ffmpeg, which applies the engine's sampling as a filter
+and emits the sampled frames as BMPs. A reader on execution's I/O pool
+batches them onto the inference process pool (analyze_frame_batch) while
+bytes are still arriving, so video inference stays bounded by
+INFERENCE_PROCESSES and out of the server process, as with whole files.
+A full pool backs up into ffmpeg and from there into the upload itself.
+total_frames counts the frames ffmpeg decoded (its showinfo log), since the
+WebM uploads from the recorder usually carry no frame count.
+
+Containers ffmpeg cannot read from a pipe (e.g. MP4 with the moov atom at
+the end) produce no frames there; those are analyzed from the finished spool
+file instead, as before.
+"""
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from collections import deque
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+from execution import INFERENCE_PROCESSES, submit_inference, submit_io
+from video_analysis import VideoEmotionEngine, analyze_frame_batch, summarize_emotions
+
+VIDEO_MAX_UPLOAD_MB = int(os.getenv("VIDEO_MAX_UPLOAD_MB", "500"))
+VIDEO_MAX_UPLOAD_BYTES = VIDEO_MAX_UPLOAD_MB * 1024 * 1024
+VIDEO_STREAM_DECODE = os.getenv("VIDEO_STREAM_DECODE", "1") == "1"
+FFMPEG = os.getenv("FFMPEG_BIN", "ffmpeg")
+# frame batches one upload may have queued on the process pool before it stops reading
+VIDEO_STREAM_MAX_BATCHES = int(os.getenv("VIDEO_STREAM_MAX_BATCHES", str(2 * INFERENCE_PROCESSES)))
+
+
+_SHOWINFO_FRAME = re.compile(rb"\[Parsed_showinfo_0 @ [^\]]*\] n:\s*(\d+)")
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def _read_exact(pipe, n: int) -> bytes | None:
+    buf = bytearray()
+    while len(buf) < n:
+        block = pipe.read(n - len(buf))
+        if not block:
+            return None
+        buf += block
+    return bytes(buf)
+
+
+def read_bmp_frames(pipe):
+    """Decode an image2pipe stream of BMPs ('BM' + little-endian uint32 file size)."""
+    while True:
+        header = _read_exact(pipe, 6)
+        if header is None:
+            return
+        if header[:2] != b"BM":
+            raise ValueError("unexpected data in ffmpeg frame pipe")
+        body = _read_exact(pipe, int.from_bytes(header[2:6], "little") - 6)
+        if body is None:
+            return
+        frame = cv2.imdecode(np.frombuffer(header + body, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is not None:
+            yield frame
+
+
+class VideoSpool:
+    """
+    Spool file + ffmpeg pipe + frame reader for one upload. engine_options are
+    VideoEmotionEngine keyword arguments; they travel to the worker processes,
+    so they must be picklable.
+    """
+
+    def __init__(self, suffix: str = "", engine_options: dict | None = None,
+                 stream_decode: bool = VIDEO_STREAM_DECODE):
+        fd, self.path = tempfile.mkstemp(suffix=suffix)
+        self._file = os.fdopen(fd, "wb")
+        self.engine_options = dict(engine_options or {})
+        self.engine = VideoEmotionEngine(**self.engine_options)  # sampling settings only; no models here
+        self.bytes = 0
+        self.labels = Future()  # frame labels from the pipe, or None when it produced nothing usable
+        self.decoded_frames = Future()  # frames ffmpeg decoded (before sampling), or None without the pipe
+        self._proc = None
+        if stream_decode and shutil.which(FFMPEG):
+            # showinfo ahead of the sampling logs one line per decoded frame on stderr
+            self._proc = subprocess.Popen(
+                [FFMPEG, "-hide_banner", "-nostats", "-loglevel", "info", "-i", "pipe:0", "-an",
+                 "-vf", f"showinfo,{self.engine.ffmpeg_filter()}", "-vsync", "vfr",
+                 "-f", "image2pipe", "-vcodec", "bmp", "pipe:1"],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            )
+            submit_io(self._analyze)
+            submit_io(self._count_decoded)
+        else:
+            self.labels.set_result(None)
+            self.decoded_frames.set_result(None)
+
+    def _analyze(self):
+        """Read sampled frames off the pipe and classify them in batches on the process pool."""
+        labels, pending, batch = [], deque(), []
+
+        def submit():
+            pending.append(submit_inference(analyze_frame_batch, list(batch), **self.engine_options))
+            batch.clear()
+
+        def drain(keep: int):
+            while len(pending) > keep:
+                labels.extend(pending.popleft().result())
+
+        try:
+            for frame in read_bmp_frames(self._proc.stdout):
+                batch.append(frame)
+                if len(batch) >= self.engine.batch_size:
+                    submit()
+                    drain(VIDEO_STREAM_MAX_BATCHES)
+            if batch:
+                submit()
+            drain(0)
+            ok = self._proc.wait() == 0
+            self.labels.set_result(labels if ok and labels else None)
+        except Exception as e:
+            for fut in pending:
+                fut.cancel()
+            print(f"[video stream] pipe analysis failed, will use the spool file: {e}")
+            self.labels.set_result(None)
+
+    def _count_decoded(self):
+        """Drain ffmpeg's stderr, counting showinfo's per-frame lines (n is the 0-based frame number)."""
+        count = 0
+        try:
+            for line in self._proc.stderr:
+                m = _SHOWINFO_FRAME.search(line)
+                if m:
+                    count = int(m.group(1)) + 1
+        finally:
+            self.decoded_frames.set_result(count)
+
+    def _close_stdin(self):
+        if self._proc is not None and self._proc.stdin and not self._proc.stdin.closed:
+            try:
+                self._proc.stdin.close()
+            except OSError:
+                pass
+
+    def feed(self, data: bytes):
+        self.bytes += len(data)
+        self._file.write(data)
+        if self._proc is not None and not self._proc.stdin.closed:
+            try:
+                self._proc.stdin.write(data)
+            except (BrokenPipeError, OSError):
+                # ffmpeg gave up (unpipeable container); keep spooling for the fallback
+                self._close_stdin()
+
+    def finish(self):
+        self._file.close()
+        self._close_stdin()
+
+    def total_frames(self) -> int:
+        """
+        Frames decoded from the pipe. The container's frame count is only a
+        fallback: WebM (what the recorder uploads) usually doesn't store one.
+        """
+        decoded = self.decoded_frames.result()
+        if decoded:
+            return decoded
+        cap = cv2.VideoCapture(self.path)
+        try:
+            return int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        finally:
+            cap.release()
+
+    def summarize(self, labels: list[str]) -> dict:
+        return summarize_emotions(labels, total_frames=self.total_frames())
+
+    def cleanup(self):
+        if not self._file.closed:
+            self._file.close()
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class VideoUpload:
+    """
+    Feeds a request body into a VideoSpool as it arrives. Multipart bodies
+    spool the `file` field; any other content type is taken as the video itself.
+    write() is blocking (disk + pipe) and meant for an I/O thread.
+    """
+
+    def __init__(self, content_type: str, filename: str = "", max_bytes: int = VIDEO_MAX_UPLOAD_BYTES,
+                 engine_options: dict | None = None):
+        self.max_bytes = max_bytes
+        self.engine_options = engine_options
+        self.received = 0
+        self.spool = None
+        self._parser = None
+        ctype, params = parse_options_header(content_type or "")
+        if ctype == b"multipart/form-data":
+            boundary = params.get(b"boundary")
+            if not boundary:
+                raise ValueError("multipart upload without a boundary")
+            self._headers, self._field, self._value, self._in_file = {}, b"", b"", False
+            self._parser = multipart.MultipartParser(boundary, callbacks={
+                "on_part_begin": self._part_begin,
+                "on_header_field": self._header_field,
+                "on_header_value": self._header_value,
+                "on_header_end": self._header_end,
+                "on_headers_finished": self._headers_finished,
+                "on_part_data": self._part_data,
+                "on_part_end": self._part_end,
+            })
+        else:
+            self.spool = VideoSpool(os.path.splitext(filename)[1], engine_options)
+
+    # ---- multipart callbacks ----
+    def _part_begin(self):
+        self._headers, self._in_file = {}, False
+
+    def _header_field(self, data, start, end):
+        self._field += data[start:end]
+
+    def _header_value(self, data, start, end):
+        self._value += data[start:end]
+
+    def _header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field, self._value = b"", b""
+
+    def _headers_finished(self):
+        _, disp = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if disp.get(b"name") == b"file" and self.spool is None:
+            filename = disp.get(b"filename", b"").decode("utf-8", "replace")
+            self.spool = VideoSpool(os.path.splitext(filename)[1], self.engine_options)
+            self._in_file = True
+
+    def _part_data(self, data, start, end):
+        if self._in_file:
+            self.spool.feed(data[start:end])
+
+    def _part_end(self):
+        self._in_file = False
+
+    # ---- body ----
+    def write(self, chunk: bytes):
+        self.received += len(chunk)
+        if self.received > self.max_bytes:
+            raise UploadTooLarge(f"upload exceeds {self.max_bytes / (1024 * 1024):g} MB")
+        if self._parser is not None:
+            self._parser.write(chunk)
+        else:
+            self.spool.feed(chunk)
+
+    def finish(self) -> VideoSpool:
+        if self._parser is not None:
+            self._parser.finalize()
+        if self.spool is None:
+            raise ValueError("No video file in upload")
+        self.spool.finish()
+        return self.spool
+
+    def cleanup(self):
+        if self.spool is not None:
+            self.spool.cleanup()
@@ -126,6 +126,23 @@ export async function saveOnboarding(params: {
     },
     { upsert: true },
   );
+  await invalidateBackendProfile(params.clerk_user_id);
+}
+
+// The FastAPI backend caches each user's questionnaire for a few minutes;
+// drop that copy after a write. Best effort: the cache TTL covers a miss.
+async function invalidateBackendProfile(clerkUserId: string): Promise<void> {
+  const base = process.env.FASTAPI_BASE_URL || process.env.NEXT_PUBLIC_FASTAPI_BASE_URL || 'http://localhost:8000';
+  try {
+    const token = process.env.INTERNAL_API_TOKEN;
+    await fetch(`${base}/users/${encodeURIComponent(clerkUserId)}/invalidate`, {
+      method: 'POST',
+      headers: token ? { 'X-Internal-Token': token } : undefined,
+      signal: AbortSignal.timeout(2000),
+    });
+  } catch (err) {
+    console.warn('profile cache invalidation failed:', err);
+  }
 }
 
 